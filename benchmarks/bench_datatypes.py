@@ -0,0 +1,695 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# benchmarks for datatypes
+#
+# Usage: python benchmarks/bench_datatypes.py [name ...]
+#
+# @author <bprinty@gmail.com>
+# ------------------------------------------------
+
+
+# imports
+# -------
+import io
+import os
+import sys
+import json
+import time
+import importlib
+import timeit
+import tracemalloc
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+from gems import composite  # noqa: E402
+
+
+# helpers
+# -------
+def document(size=1000):
+    """
+    Generate realistic config/catalog document with ``size`` records.
+    """
+    return {
+        'version': 3,
+        'name': 'catalog',
+        'settings': {
+            'region': 'us-east-1',
+            'retries': 5,
+            'timeouts': {'connect': 1.5, 'read': 30.0},
+            'features': ['search', 'export', 'audit'],
+        },
+        'items': [
+            {
+                'id': idx,
+                'sku': 'SKU-{:08d}'.format(idx),
+                'name': 'Item number {}'.format(idx),
+                'price': round(idx * 1.25, 2),
+                'active': idx % 3 != 0,
+                'tags': [{'name': 'tag{}'.format(idx % 7)}, {'name': 'group{}'.format(idx % 11)}],
+                'dimensions': {'width': idx % 40, 'height': idx % 25, 'unit': 'cm'},
+            } for idx in range(size)
+        ]
+    }
+
+
+def timed(func, number=1, repeat=5):
+    """
+    Return best time (in milliseconds) for calling function.
+    """
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number * 1000
+
+
+def peak(func):
+    """
+    Return peak memory (in MB) allocated while calling function.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 1024.0 / 1024.0
+    finally:
+        tracemalloc.stop()
+
+
+def report(title, rows):
+    """
+    Print table of benchmark results.
+    """
+    print('\n' + title)
+    print('-' * len(title))
+    for label, value in rows:
+        print('{:<48} {:>12}'.format(label, value))
+    return
+
+
+def score(item):
+    """
+    CPU-bound record transform for map benchmarks (defined at module
+    level, so that it can be sent to process pools).
+    """
+    total = 0
+    for idx in range(50):
+        total += (item['id'] * idx) % 7
+    return {'id': item['id'], 'score': total}
+
+
+# benchmarks
+# ----------
+def bench_load():
+    """
+    Load time for json and yaml inputs, with format detection.
+    """
+    data = document(2000)
+    jstr = json.dumps(data)
+    ystr = yaml.dump(data)
+    rows = [
+        ('json load (detected)', '{:.2f} ms'.format(timed(lambda: composite.load(io.StringIO(jstr))))),
+        ('json load (format=json)', '{:.2f} ms'.format(timed(lambda: composite.load(io.StringIO(jstr), format='json')))),
+        ('yaml load (detected)', '{:.2f} ms'.format(timed(lambda: composite.load(io.StringIO(ystr)), repeat=3))),
+        ('yaml load (format=yaml)', '{:.2f} ms'.format(timed(lambda: composite.load(io.StringIO(ystr), format='yaml'), repeat=3))),
+    ]
+
+    def failed():
+        try:
+            json.loads(ystr)
+        except ValueError:
+            pass
+    rows.append(('failed json parse avoided for yaml', '{:.3f} ms'.format(timed(failed))))
+    report('load (2000 records)', rows)
+    return
+
+
+def bench_from_string():
+    """
+    Loading python literals (``str(data)``) and json with from_string,
+    compared to eval() and ast.literal_eval.
+    """
+    import ast
+    rows = []
+    for size in [200, 2000]:
+        data = document(size)
+        text, jstr = str(data), json.dumps(data)
+        rows.extend([
+            ('eval ({} records)'.format(size), '{:.2f} ms'.format(timed(lambda: composite(eval(text)), repeat=3))),
+            ('ast.literal_eval ({} records)'.format(size), '{:.2f} ms'.format(timed(lambda: composite(ast.literal_eval(text)), repeat=3))),
+            ('from_string, literal ({} records)'.format(size), '{:.2f} ms'.format(timed(lambda: composite.from_string(text), repeat=3))),
+            ('from_string, json ({} records)'.format(size), '{:.2f} ms'.format(timed(lambda: composite.from_string(jstr), repeat=3))),
+        ])
+    data = document(2000)
+    text = str(data)
+    rows.extend([
+        ('ast.literal_eval peak (2000 records)', '{:.2f} MB'.format(peak(lambda: composite(ast.literal_eval(text))))),
+        ('from_string peak (2000 records)', '{:.2f} MB'.format(peak(lambda: composite.from_string(text)))),
+    ])
+    report('from_string', rows)
+    return
+
+
+def bench_write():
+    """
+    Time and peak memory for writing composite to json, compared to
+    the previous encode/decode/encode round trip.
+    """
+    data = composite(document(5000))
+
+    class Sink(object):
+        def write(self, chunk):
+            pass
+
+    def roundtrip(pretty):
+        sjson = json.JSONEncoder().encode(data.json())
+        if pretty:
+            json.dump(json.loads(sjson), Sink(), sort_keys=True, indent=4)
+        else:
+            json.dump(json.loads(sjson), Sink())
+
+    rows = []
+    for pretty in [True, False]:
+        label = 'pretty' if pretty else 'compact'
+        rows.extend([
+            ('round trip ({})'.format(label), '{:.2f} ms'.format(timed(lambda: roundtrip(pretty), repeat=3))),
+            ('write_json ({})'.format(label), '{:.2f} ms'.format(timed(lambda: data.write_json(Sink(), pretty=pretty), repeat=3))),
+            ('round trip peak ({})'.format(label), '{:.2f} MB'.format(peak(lambda: roundtrip(pretty)))),
+            ('write_json peak ({})'.format(label), '{:.2f} MB'.format(peak(lambda: data.write_json(Sink(), pretty=pretty)))),
+        ])
+    report('write_json (5000 records)', rows)
+    return
+
+
+def bench_yaml():
+    """
+    Load and write time for yaml config files, comparing pure-python
+    and libyaml (C-accelerated) loaders and dumpers.
+    """
+    data = composite(document(1000))
+    ystr = yaml.dump(data.json())
+
+    class Sink(object):
+        def write(self, chunk):
+            pass
+
+    rows = [
+        ('pure-python load (FullLoader)', '{:.2f} ms'.format(timed(lambda: composite(yaml.load(ystr, Loader=yaml.FullLoader)), repeat=3))),
+        ('composite.from_yaml', '{:.2f} ms'.format(timed(lambda: composite.from_yaml(ystr), repeat=3))),
+        ('composite.from_yaml (safe)', '{:.2f} ms'.format(timed(lambda: composite.from_yaml(ystr, safe=True), repeat=3))),
+        ('pure-python dump (Dumper)', '{:.2f} ms'.format(timed(lambda: yaml.dump(data.json(), Sink()), repeat=3))),
+        ('composite.write_yaml', '{:.2f} ms'.format(timed(lambda: data.write_yaml(Sink()), repeat=3))),
+    ]
+    report('yaml (1000 records, libyaml={})'.format(yaml.__with_libyaml__), rows)
+    return
+
+
+def bench_setops():
+    """
+    Scaling of list set operations (intersection, difference, union)
+    over growing lists of records, compared to linear membership scans.
+    """
+    rows = []
+    for size in [1000, 5000, 20000, 50000]:
+        records = document(size)['items']
+        left = composite(records)
+        right = composite(records[size // 2:] + document(size + size // 2)['items'][size:])
+        for name in ['intersection', 'difference', 'union']:
+            op = getattr(left, name)
+            rows.append((
+                '{} ({} items)'.format(name, size),
+                '{:.2f} ms'.format(timed(lambda: op(right), repeat=1))
+            ))
+        if size <= 1000:
+            rows.append((
+                'linear intersection ({} items)'.format(size),
+                '{:.2f} ms'.format(timed(lambda: [item for item in left._list if item in right._list], repeat=1))
+            ))
+    report('list set operations', rows)
+    return
+
+
+def bench_access():
+    """
+    Per-hop cost of attribute and item access on composite objects
+    (deep attribute chains, item access, mixed access and writes),
+    compared to plain dictionaries and lists.
+    """
+    raw = {'a': {'b': {'c': {'d': {'e': 1}}}}, 'records': [{'id': idx, 'tags': ['x', 'y']} for idx in range(10)]}
+    data = composite(raw)
+    lazy = composite(raw, lazy=True)
+    number = 200000
+
+    def per_hop(func, hops):
+        return '{:.1f} ns/hop'.format(timed(func, number=number) / hops * 1e6)
+
+    rows = [
+        ('plain dict chain (5 hops)', per_hop(lambda: raw['a']['b']['c']['d']['e'], 5)),
+        ('attribute chain (5 hops)', per_hop(lambda: data.a.b.c.d.e, 5)),
+        ('attribute chain, lazy (5 hops)', per_hop(lambda: lazy.a.b.c.d.e, 5)),
+        ('item chain (5 hops)', per_hop(lambda: data['a']['b']['c']['d']['e'], 5)),
+        ('mixed access (4 hops)', per_hop(lambda: data.records[3].tags[1], 4)),
+        ('mixed access, lazy (4 hops)', per_hop(lambda: lazy.records[3].tags[1], 4)),
+        ('missing attribute (getattr default)', per_hop(lambda: getattr(data, 'missing', None), 1)),
+    ]
+    node = data.a.b.c.d
+
+    def write():
+        node.e = 2
+    rows.append(('attribute write', per_hop(write, 1)))
+
+    def setitem():
+        node['e'] = 2
+    rows.append(('item write', per_hop(setitem, 1)))
+    rows.append(('construction (25005 nodes)', '{:.2f} ms'.format(timed(lambda: composite(document(5000)), repeat=3))))
+    report('attribute access ({} calls)'.format(number), rows)
+    return
+
+
+def bench_paths():
+    """
+    Extracting the same deep path from many records, with attribute
+    access, path strings and compiled path accessors.
+    """
+    records = composite(document(5000)['items'])
+    getter = composite.compile_path('tags[1].name')
+    rows = [
+        ('attribute access (5000 records)', '{:.2f} ms'.format(timed(lambda: [item.tags[1].name for item in records], repeat=10))),
+        ('get_path (5000 records)', '{:.2f} ms'.format(timed(lambda: [item.get_path('tags[1].name') for item in records], repeat=10))),
+        ('compiled path (5000 records)', '{:.2f} ms'.format(timed(lambda: [getter(item) for item in records], repeat=10))),
+        ('compiled path map (5000 records)', '{:.2f} ms'.format(timed(lambda: getter.map(records), repeat=10))),
+    ]
+    report('paths', rows)
+    return
+
+
+def bench_index():
+    """
+    Looking up records by field with a secondary index, compared to
+    scanning the list, and the cost of keeping the index up to date.
+    """
+    rows = []
+    for size in [1000, 10000, 50000]:
+        records = composite(document(size)['items'])
+        rows.append(('linear scan ({} items)'.format(size), '{:.3f} ms'.format(
+            timed(lambda: [item for item in records if item.id == size // 2], repeat=3)
+        )))
+        rows.append(('create_index ({} items)'.format(size), '{:.2f} ms'.format(
+            timed(lambda: records.create_index('id'), repeat=3)
+        )))
+        rows.append(('lookup ({} items)'.format(size), '{:.4f} ms'.format(
+            timed(lambda: records.lookup('id', size // 2), number=1000)
+        )))
+    plain = composite(document(10000)['items'])
+    indexed = composite(document(10000)['items'])
+    indexed.create_index('id')
+    rows.append(('append (no index)', '{:.4f} ms'.format(timed(lambda: plain.append({'id': -1}), number=1000))))
+    rows.append(('append (indexed)', '{:.4f} ms'.format(timed(lambda: indexed.append({'id': -1}), number=1000))))
+    report('secondary indexes', rows)
+    return
+
+
+def bench_layering():
+    """
+    Time and memory for layering a small override on a large base
+    config (``+``, ``union`` and ``update``), and for the first write
+    into a subtree shared with the base.
+    """
+    base = composite(document(50000))
+    override = {'settings': {'retries': 3, 'timeouts': {'read': 10.0}}, 'name': 'override'}
+
+    def update():
+        data = composite(base)
+        data.update(override)
+
+    def write():
+        data = base + override
+        data.settings.features.append('extra')
+
+    rows = [
+        ('base + override', '{:.3f} ms'.format(timed(lambda: base + override, number=20))),
+        ('base.union(override)', '{:.3f} ms'.format(timed(lambda: base.union(composite(override), overwrite=True), number=20))),
+        ('update (copy of base)', '{:.3f} ms'.format(timed(update, number=20))),
+        ('derive + write to shared subtree', '{:.3f} ms'.format(timed(write, number=20))),
+        ('base + override peak', '{:.3f} MB'.format(peak(lambda: base + override))),
+    ]
+    report('layering (50000 records)', rows)
+    return
+
+
+def bench_update():
+    """
+    Applying a small patch to a growing live config with ``update``,
+    compared to rebuilding the config with ``+``.
+    """
+    patch = {'settings': {'retries': 3, 'timeouts': {'read': 10.0}, 'features': ['audit', 'debug']}, 'version': 4}
+    record = dict(document(1)['items'][0], id=-1)
+    rows = []
+    for size in [1000, 10000, 50000]:
+        data = composite(document(size))
+        rows.extend([
+            ('data + patch ({} records)'.format(size), '{:.4f} ms'.format(timed(lambda: data + patch, number=100))),
+            ('update ({} records)'.format(size), '{:.4f} ms'.format(timed(lambda: data.update(patch), number=100))),
+            ('update with record ({} records)'.format(size), '{:.4f} ms'.format(timed(lambda: data.update({'items': [record]}), number=10))),
+        ])
+        data['items'].create_index('id')
+        rows.append(('update with record, indexed ({} records)'.format(size), '{:.4f} ms'.format(timed(lambda: data.update({'items': [record]}), number=100))))
+    report('update (small patch)', rows)
+    return
+
+
+def bench_diff():
+    """
+    Size and time of shipping a small config change as a delta
+    (``diff`` and ``patch``), compared to the whole document, for
+    independent copies and for composite objects derived from the base.
+    """
+    raw = document(50000)
+    base = composite(raw)
+    changed = composite(raw)
+    changed.settings.retries = 3
+    changed['items'][100].price = 0.5
+    changed['items'].append({'id': -1})
+    derived = base + {'version': 4}
+    derived.settings.timeouts.read = 10.0
+    ops = base.diff(changed)
+    rows = [
+        ('document size', '{:.1f} KB'.format(len(json.dumps(changed.json())) / 1024.0)),
+        ('delta size ({} ops)'.format(len(ops)), '{:.3f} KB'.format(len(json.dumps(ops)) / 1024.0)),
+        ('diff (independent copies)', '{:.2f} ms'.format(timed(lambda: base.diff(changed), repeat=3))),
+        ('diff (derived, shared subtrees)', '{:.3f} ms'.format(timed(lambda: base.diff(derived), number=20))),
+        ('patch', '{:.3f} ms'.format(timed(lambda: composite(raw, lazy=True).patch(ops), number=20))),
+        ('write_json (whole document)', '{:.2f} ms'.format(timed(lambda: changed.write_json(io.StringIO(), pretty=False), repeat=3))),
+    ]
+    report('diff and patch (50000 records)', rows)
+    return
+
+
+def bench_snapshot():
+    """
+    Startup time and memory for a worker opening a large catalog from
+    a memory-mapped snapshot, compared to parsing the json file.
+    """
+    import tempfile
+    data = composite(document(50000))
+    directory = tempfile.mkdtemp()
+    jpath, spath = os.path.join(directory, 'catalog.json'), os.path.join(directory, 'catalog.snap')
+    with open(jpath, 'w') as fh:
+        data.write_json(fh, pretty=False)
+    try:
+        def load():
+            with open(jpath, 'r') as fh:
+                return composite.load(fh, format='json')
+
+        def lookup():
+            return composite.open_snapshot(spath)['items'][25000].tags[1].name
+
+        rows = [
+            ('save_snapshot', '{:.2f} ms'.format(timed(lambda: data.save_snapshot(spath), repeat=3))),
+            ('json file size', '{:.1f} MB'.format(os.path.getsize(jpath) / 1024.0 / 1024.0)),
+            ('snapshot file size', '{:.1f} MB'.format(os.path.getsize(spath) / 1024.0 / 1024.0)),
+            ('composite.load (json)', '{:.2f} ms'.format(timed(load, repeat=3))),
+            ('open_snapshot', '{:.3f} ms'.format(timed(lambda: composite.open_snapshot(spath), number=100))),
+            ('open_snapshot + deep lookup', '{:.3f} ms'.format(timed(lookup, number=20))),
+            ('full walk (json()) of snapshot', '{:.2f} ms'.format(timed(lambda: composite.open_snapshot(spath).json(), repeat=3))),
+            ('composite.load peak (json)', '{:.2f} MB'.format(peak(load))),
+            ('open_snapshot + deep lookup peak', '{:.2f} MB'.format(peak(lookup))),
+        ]
+    finally:
+        os.remove(jpath)
+        os.remove(spath)
+        os.rmdir(directory)
+    report('snapshots (50000 records)', rows)
+    return
+
+
+def bench_binary():
+    """
+    Payload size and encode/decode time for binary formats (msgpack,
+    cbor and pickle), compared to json.
+    """
+    import pickle
+    data = composite(document(20000))
+
+    def encode(name):
+        if name == 'json':
+            stream = io.StringIO()
+            data.write_json(stream, pretty=False)
+            return stream.getvalue()
+        elif name == 'pickle':
+            return pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+        stream = io.BytesIO()
+        data.write_binary(stream, format=name)
+        return stream.getvalue()
+
+    def decode(name, payload):
+        if name == 'json':
+            return composite.from_json(payload)
+        elif name == 'pickle':
+            return pickle.loads(payload)
+        return composite.from_binary(payload, format=name)
+
+    rows = []
+    for name in ['json', 'msgpack', 'cbor', 'pickle']:
+        try:
+            payload = encode(name)
+        except AssertionError:
+            rows.append((name, 'not installed'))
+            continue
+        rows.extend([
+            ('{} size'.format(name), '{:.2f} MB'.format(len(payload) / 1024.0 / 1024.0)),
+            ('{} encode'.format(name), '{:.2f} ms'.format(timed(lambda: encode(name), repeat=3))),
+            ('{} decode'.format(name), '{:.2f} ms'.format(timed(lambda: decode(name, payload), repeat=3))),
+        ])
+    report('binary formats (20000 records)', rows)
+    return
+
+
+def bench_columns():
+    """
+    Aggregating fields of records with python loops, compared to
+    converting to numpy columns and vectorized aggregation.
+    """
+    try:
+        importlib.import_module('numpy')
+    except ImportError:
+        report('columns', [('numpy', 'not installed')])
+        return
+    records = composite(document(50000)['items'])
+    columns = records.to_columns()
+
+    def loop():
+        total = 0
+        for item in records:
+            if item.active:
+                total += item.price
+        return total
+
+    def vectorized():
+        return columns['price'][columns['active']].sum()
+
+    rows = [
+        ('python loop (active price total)', '{:.2f} ms'.format(timed(loop, repeat=3))),
+        ('to_columns', '{:.2f} ms'.format(timed(lambda: records.to_columns(), repeat=3))),
+        ('to_columns (2 fields)', '{:.2f} ms'.format(timed(lambda: records.to_columns(fields=['price', 'active']), repeat=3))),
+        ('vectorized (active price total)', '{:.3f} ms'.format(timed(vectorized, number=100))),
+        ('from_columns', '{:.2f} ms'.format(timed(lambda: composite.from_columns(columns), repeat=3))),
+    ]
+    report('columns (50000 records)', rows)
+    return
+
+
+def bench_map():
+    """
+    Transforming and filtering records of a large list with map and
+    filter (serially, and in thread and process pools), compared to
+    rebuilding the list with a python loop.
+    """
+    import multiprocessing
+    records = composite(document(50000)['items'])
+    workers = multiprocessing.cpu_count()
+    rows = [
+        ('loop + composite() (transform)', '{:.2f} ms'.format(timed(lambda: composite([score(item) for item in records]), repeat=3))),
+        ('map (transform)', '{:.2f} ms'.format(timed(lambda: records.map(score), repeat=3))),
+        ('map, threads (transform)', '{:.2f} ms'.format(timed(lambda: records.map(score, executor='thread'), repeat=3))),
+        ('map, {} processes (transform)'.format(workers), '{:.2f} ms'.format(timed(lambda: records.map(score, executor='process'), repeat=3))),
+        ('loop + composite() (filter)', '{:.2f} ms'.format(timed(lambda: composite([item for item in records if item.active]), repeat=3))),
+        ('filter', '{:.2f} ms'.format(timed(lambda: records.filter(lambda item: item.active), repeat=3))),
+    ]
+    report('map and filter (50000 records)', rows)
+    return
+
+
+def bench_load_many():
+    """
+    Loading (and merging) many config files with load_many, compared
+    to calling load serially.
+    """
+    import shutil
+    import tempfile
+    directory = tempfile.mkdtemp()
+    paths = []
+    for idx in range(200):
+        data = document(20)
+        data['settings']['layer{}'.format(idx)] = idx
+        paths.append(os.path.join(directory, 'config{:03d}.{}'.format(idx, 'yml' if idx % 2 else 'json')))
+        with open(paths[-1], 'w') as fh:
+            if idx % 2:
+                yaml.dump(data, fh)
+            else:
+                json.dump(data, fh)
+
+    def serial():
+        loaded = []
+        for path in paths:
+            with open(path, 'r') as fh:
+                loaded.append(composite.load(fh))
+        return loaded
+
+    def fold():
+        loaded = serial()
+        result = loaded[0]
+        for item in loaded[1:]:
+            result = result.union(item, overwrite=True)
+        return result
+
+    try:
+        rows = [
+            ('serial load', '{:.2f} ms'.format(timed(serial, repeat=3))),
+            ('load_many (executor=None)', '{:.2f} ms'.format(timed(lambda: composite.load_many(paths, executor=None), repeat=3))),
+            ('load_many (threads)', '{:.2f} ms'.format(timed(lambda: composite.load_many(paths, executor='thread'), repeat=3))),
+            ('load_many (processes)', '{:.2f} ms'.format(timed(lambda: composite.load_many(paths), repeat=3))),
+            ('serial load + left fold union', '{:.2f} ms'.format(timed(fold, repeat=3))),
+            ('load_many (processes, merge)', '{:.2f} ms'.format(timed(lambda: composite.load_many(paths, merge=True), repeat=3))),
+        ]
+    finally:
+        shutil.rmtree(directory)
+    report('load_many (200 files, 20 records each)', rows)
+    return
+
+
+def bench_async():
+    """
+    Worst event loop stall (gap between 1 ms ticks) while loading a
+    large yaml file, with load called on the loop compared to aload.
+    """
+    import asyncio
+    import tempfile
+    from concurrent import futures
+    fd, path = tempfile.mkstemp(suffix='.yml')
+    with os.fdopen(fd, 'w') as fh:
+        yaml.dump(document(2000), fh)
+
+    def stall(start):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        ticks = []
+
+        def tick():
+            ticks.append(time.time())
+            loop.call_later(0.001, tick)
+
+        try:
+            loop.call_soon(tick)
+            began = time.time()
+            loop.run_until_complete(start())
+            elapsed = time.time() - began
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+        gaps = [b - a for a, b in zip(ticks, ticks[1:])] or [elapsed]
+        return '{:.1f} ms / {:.1f} ms'.format(max(gaps) * 1000, elapsed * 1000)
+
+    def blocking():
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+
+        def run():
+            with open(path, 'r') as fh:
+                future.set_result(composite.load(fh))
+
+        loop.call_later(0.005, run)
+        return future
+
+    try:
+        with futures.ProcessPoolExecutor(1) as processes:
+            processes.submit(len, []).result()
+            rows = [
+                ('load on event loop', stall(blocking)),
+                ('aload (default thread executor)', stall(lambda: composite.aload(path))),
+                ('aload (process executor)', stall(lambda: composite.aload(path, executor=processes))),
+            ]
+    finally:
+        os.remove(path)
+    report('event loop stall / total (yaml, 2000 records)', rows)
+    return
+
+
+def bench_cache():
+    """
+    Loading unchanged yaml and json files with a parse cache, compared
+    to parsing them on every load.
+    """
+    import shutil
+    import tempfile
+    directory = tempfile.mkdtemp()
+    cache = os.path.join(directory, 'cache')
+    rows = []
+    try:
+        for format in ['yaml', 'json']:
+            path = os.path.join(directory, 'catalog.' + format)
+            with open(path, 'w') as fh:
+                (yaml.dump if format == 'yaml' else json.dump)(document(5000), fh)
+
+            def load(**kwargs):
+                with open(path, 'r') as fh:
+                    return composite.load(fh, **kwargs)
+
+            load(cache=cache)
+            rows.extend([
+                ('{} parse'.format(format), '{:.2f} ms'.format(timed(load, repeat=3))),
+                ('{} cached'.format(format), '{:.2f} ms'.format(timed(lambda: load(cache=cache), repeat=3))),
+                ('{} parse (lazy)'.format(format), '{:.2f} ms'.format(timed(lambda: load(lazy=True), repeat=3))),
+                ('{} cached (lazy)'.format(format), '{:.2f} ms'.format(timed(lambda: load(cache=cache, lazy=True), repeat=3))),
+            ])
+    finally:
+        shutil.rmtree(directory)
+    report('load cache (5000 records)', rows)
+    return
+
+
+def bench_memory():
+    """
+    Bytes per composite node (tracemalloc) for a deep, realistic document,
+    compared to the plain dictionaries and lists it was built from.
+    """
+    raw = document(5000)
+
+    def count(value):
+        if isinstance(value, dict):
+            return 1 + sum(count(item) for item in value.values())
+        elif isinstance(value, list):
+            return 1 + sum(count(item) for item in value)
+        return 0
+
+    nodes = count(raw)
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    data = composite(raw)
+    after = tracemalloc.get_traced_memory()[0]
+    plain = data.json()
+    final = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del plain
+    report('memory ({} nested nodes)'.format(nodes), [
+        ('composite bytes per node', '{:.1f}'.format(float(after - before) / nodes)),
+        ('plain dict/list bytes per node', '{:.1f}'.format(float(final - after) / nodes)),
+    ])
+    return
+
+
+# exec
+# ----
+if __name__ == '__main__':
+    names = sys.argv[1:] or sorted(
+        name[6:] for name in dir() if name.startswith('bench_')
+    )
+    for name in names:
+        globals()['bench_' + name]()
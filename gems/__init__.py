@@ -6,6 +6,7 @@ __version__ = '0.4.0'
 
 
 from .datatypes import composite     ## noqa
+from .datatypes import frozencomposite  ## noqa
 from .datatypes import filetree      ## noqa
 
 from .decorators import require      ## noqa
@@ -9,7 +9,16 @@
 # -------
 import os
 import re
+import sys
+import ast
 import json
+import mmap
+import codecs
+import pickle
+import hashlib
+import tempfile
+import functools
+import struct
 import yaml
 import glob
 
@@ -21,6 +30,1364 @@ try:
 except NameError:
     basestring = str
 
+try:
+    long
+except NameError:
+    long = int
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+# yaml
+# ----
+try:
+    from yaml import CFullLoader as YAMLLoader
+    from yaml import CSafeLoader as YAMLSafeLoader
+    from yaml import CDumper as YAMLDumper
+except ImportError:
+    from yaml import FullLoader as YAMLLoader
+    from yaml import SafeLoader as YAMLSafeLoader
+    from yaml import Dumper as YAMLDumper
+
+
+class _yamldumper(YAMLDumper):
+    """
+    YAML dumper (C-accelerated when libyaml is available) that represents
+    composite objects directly from their internal store. Objects reached
+    more than once are written out in full (like copies from json()),
+    instead of as anchors and aliases.
+    """
+
+    def ignore_aliases(self, data):
+        return True
+
+    def represent_composite(self, data):
+        if data._kind == _DICT:
+            return self.represent_dict(data._data)
+        return self.represent_list(data._data)
+
+
+# helpers
+# -------
+def _plain(value):
+    """
+    Return plain (JSON-compatible) copy of value, which may be a
+    composite object or raw nested data held by a lazy composite.
+    """
+    if isinstance(value, composite):
+        return value.json()
+    elif isinstance(value, dict):
+        return {key: _plain(value[key]) for key in value}
+    elif isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+# starts of json documents, which aren't common starts of yaml documents
+# (i.e. flow mappings with quoted keys, or flow sequences of json values),
+# and json documents that are a single string
+_JSON_HEAD = re.compile(r'(?:\[\s*)*(?:\{\s*["}]|[\]"\-0-9]|true\b|false\b|null\b)')
+_JSON_STRING = re.compile(r'"(?:[^"\\]|\\.)*"\s*\Z')
+
+
+def _sniff_format(text=None, name=None):
+    """
+    Guess format of serialized data from file name or content, without
+    parsing it. File extensions take precedence, followed by yaml
+    document markers and the first tokens of the document.
+
+    Args:
+        text (str): Content (or first chunk of content) to inspect.
+        name (str): File name to inspect.
+    """
+    if isinstance(name, basestring):
+        ext = os.path.splitext(name)[1].lower()
+        if ext in _EXTENSIONS:
+            return _EXTENSIONS[ext]
+    if text is None:
+        return None
+    if isinstance(text, bytes) and not isinstance(text, str):
+        text = text.decode('utf-8', 'replace')
+    text = text.lstrip(u'\ufeff')
+    match = re.match(r'\s*(\S)', text)
+    if match is None:
+        return 'yaml'
+    if text.startswith(('---', '%YAML', '#'), match.start(1)):
+        return 'yaml'
+    if match.group(1) == '"':
+        return 'json' if _JSON_STRING.match(text, match.start(1)) else 'yaml'
+    if match.group(1) in '{[' and _JSON_HEAD.match(text, match.start(1)):
+        return 'json'
+    return 'yaml'
+
+
+def _sniff_stream(fh):
+    """
+    Guess format of data in file handle from its name or first chunk
+    of content, restoring the position of seekable file handles.
+    """
+    fmt = _sniff_format(name=getattr(fh, 'name', None))
+    if fmt is not None:
+        return fmt
+    try:
+        pos = fh.tell()
+        head = fh.read(1024)
+        fh.seek(pos)
+    except (AttributeError, IOError, OSError, ValueError):
+        return 'json'
+    return _sniff_format(head)
+
+
+# tokens of python literals that aren't valid json (single-quoted strings,
+# strings with escapes and names of constants); other double-quoted
+# strings are matched so that their content isn't translated
+_LITERAL_TOKENS = re.compile(r'''
+    '(?P<single>(?:[^'\\\n]|\\.)*)'
+  | "(?:[^"\\\n]|\\.)*"
+  | \b(?:None|True|False|nan|inf)\b
+''', re.VERBOSE)
+_LITERAL_NAMES = {'None': 'null', 'True': 'true', 'False': 'false', 'nan': 'NaN', 'inf': 'Infinity'}
+
+
+def _literal_token(match):
+    """
+    Translate python literal token to json.
+    """
+    token = match.group(0)
+    if token in _LITERAL_NAMES:
+        return _LITERAL_NAMES[token]
+    single = match.group('single')
+    if '\\' in token or (single is not None and '"' in single):
+        return json.dumps(ast.literal_eval(token))
+    if single is not None:
+        return '"' + single + '"'
+    return token
+
+
+def _parse_literal(text):
+    """
+    Parse python literal (i.e. the repr() of nested data) without eval().
+    Literals are translated to json in a single pass and parsed by the
+    json module, which is several times faster than ast.literal_eval and
+    doesn't build a syntax tree for the whole input. Anything that can't
+    be translated (tuples, sets, non-string keys, string prefixes, etc.)
+    makes the json invalid, and falls back to ast.literal_eval.
+    """
+    try:
+        return json.loads(_LITERAL_TOKENS.sub(_literal_token, text), strict=False)
+    except (ValueError, SyntaxError):
+        return ast.literal_eval(text)
+
+
+# file extensions for supported formats
+_EXTENSIONS = {
+    '.json': 'json',
+    '.yml': 'yaml',
+    '.yaml': 'yaml',
+    '.msgpack': 'msgpack',
+    '.cbor': 'cbor',
+}
+
+
+def _equal(left, right):
+    """
+    Compare nested data structurally, walking composite objects and raw
+    containers in place and returning on the first mismatch in type,
+    length, keys or value. Lists and tuples compare equal, since
+    composite objects store both as lists.
+    """
+    if left is right:
+        return True
+    if isinstance(left, composite):
+        left = left._data
+    if isinstance(right, composite):
+        right = right._data
+    if left is right:
+        return True
+
+    if isinstance(left, dict):
+        if not isinstance(right, dict) or len(left) != len(right):
+            return False
+        for key in left:
+            if key not in right or not _equal(left[key], right[key]):
+                return False
+        return True
+
+    elif isinstance(left, (list, tuple)):
+        if not isinstance(right, (list, tuple)) or len(left) != len(right):
+            return False
+        for litem, ritem in zip(left, right):
+            if not _equal(litem, ritem):
+                return False
+        return True
+
+    elif isinstance(right, (dict, list, tuple)):
+        return False
+    return left == right
+
+
+def _hashof(value):
+    """
+    Return structural hash of nested data, consistent with _equal. Hashes
+    for frozen composite objects are computed once per subtree and cached.
+    """
+    if isinstance(value, frozencomposite):
+        return hash(value)
+    if isinstance(value, composite):
+        value = value._data
+    if isinstance(value, dict):
+        return hash(frozenset((key, _hashof(value[key])) for key in value))
+    elif isinstance(value, (list, tuple)):
+        return hash(tuple(_hashof(item) for item in value))
+    return hash(value)
+
+
+class _hashindex(object):
+    """
+    Multimap from nested values (composite objects, raw containers or
+    scalars) to entries, keyed by structural hash. Entries in the same
+    bucket are checked for equality, and unhashable values fall back to
+    a linear scan.
+
+    Args:
+        keys (iterable): Keys to index (with ``None`` entries).
+    """
+
+    def __init__(self, keys=()):
+        self.buckets = {}
+        self.unhashable = []
+        for key in keys:
+            self.add(key)
+        return
+
+    def bucket(self, key, create=False):
+        try:
+            code = _hashof(key)
+        except TypeError:
+            return self.unhashable
+        if create:
+            return self.buckets.setdefault(code, [])
+        return self.buckets.get(code, ())
+
+    def add(self, key, entry=None):
+        self.bucket(key, create=True).append((key, entry))
+        return
+
+    def get(self, key):
+        return [entry for item, entry in self.bucket(key) if _equal(item, key)]
+
+    def remove(self, key, entry=None):
+        bucket = self.bucket(key)
+        for idx, (item, value) in enumerate(bucket):
+            if value is entry and _equal(item, key):
+                del bucket[idx]
+                return
+        raise KeyError(key)
+
+    def replace(self, key, entry, new):
+        bucket = self.bucket(key)
+        for idx, (item, value) in enumerate(bucket):
+            if value is entry:
+                bucket[idx] = (item, new)
+                return
+        return
+
+    def copy(self):
+        other = _hashindex()
+        other.buckets = {code: list(bucket) for code, bucket in self.buckets.items()}
+        other.unhashable = list(self.unhashable)
+        return other
+
+    def discard(self, key, entry=None):
+        try:
+            self.remove(key, entry)
+        except KeyError:
+            # key may have changed since entry was added
+            for bucket in [self.unhashable] + list(self.buckets.values()):
+                for idx, (item, value) in enumerate(bucket):
+                    if value is entry:
+                        del bucket[idx]
+                        return
+        return
+
+    def __contains__(self, key):
+        for item, entry in self.bucket(key):
+            if _equal(item, key):
+                return True
+        return False
+
+
+# kinds of composite objects
+_LIST = 1
+_DICT = 2
+_KINDS = {_LIST: 'list', _DICT: 'dict'}
+
+
+# attributes stored on composite objects instead of in data
+_INTERNAL = frozenset(['_data', '_kind', '_lazy', '_shared', '_indexes', '_hash', 'meta_type', '_list', '_dict'])
+_setattr = object.__setattr__
+
+
+# sentinel key for list items in streamed data
+_listitem = object()
+
+
+# sentinel for missing default values
+_missing = object()
+
+
+# largest list patches merged by scanning the list instead of hashing it
+_MERGE_SCAN = 16
+
+
+# copy-on-write states of composite objects (``_shared``): the store is
+# lent to other composite objects, borrowed from another composite object,
+# or borrowed from a frozen composite object (with children to thaw)
+_SHARED = 1
+_BORROWED = 2
+_THAWED = 3
+
+
+class _jsonstream(object):
+    """
+    Incremental reader for JSON documents, which decodes values from a
+    file handle in chunks instead of reading the full document into
+    memory.
+
+    Args:
+        fh (file): File handle to read from.
+        chunk_size (int): Number of characters to read at a time.
+    """
+    whitespace = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, fh, chunk_size=65536):
+        self.fh = fh
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.reader = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        return
+
+    def fill(self, size=None):
+        """
+        Read next chunk from file handle into buffer, discarding
+        everything that has already been consumed. Reads ending inside
+        multi-byte characters are continued, so the end of the stream is
+        only reached once the file handle is exhausted.
+        """
+        while True:
+            chunk = self.fh.read(size or self.chunk_size)
+            binary = isinstance(chunk, bytes) and not isinstance(chunk, str)
+            if not chunk:
+                if binary:
+                    self.reader.decode(chunk, final=True)
+                self.eof = True
+                return False
+            if binary:
+                chunk = self.reader.decode(chunk)
+            if chunk:
+                break
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        Return next non-whitespace character without consuming it, or
+        an empty string at the end of the stream.
+        """
+        while True:
+            self.pos = self.whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, chars):
+        """
+        Consume next non-whitespace character, which must be one
+        of the specified characters.
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError('Expecting one of {!r} in JSON stream, got {!r}'.format(chars, char))
+        self.pos += 1
+        return char
+
+    def value(self):
+        """
+        Decode and consume next complete JSON value in stream.
+        """
+        self.peek()
+        size = self.chunk_size
+        while True:
+            try:
+                obj, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # numbers at the end of the buffer may be truncated
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return obj
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill(size)
+            size *= 2
+
+    def seek(self, keys):
+        """
+        Advance stream to the value at the specified path.
+        """
+        for key in keys:
+            char = self.peek()
+            if char == '{':
+                self.expect('{')
+                found = False
+                while self.peek() != '}':
+                    name = self.value()
+                    self.expect(':')
+                    if name == key:
+                        found = True
+                        break
+                    self.value()
+                    if self.expect(',}') == '}':
+                        break
+                if not found:
+                    raise KeyError(key)
+            elif char == '[':
+                self.expect('[')
+                for idx in range(int(key) + 1):
+                    if self.peek() == ']':
+                        raise KeyError(key)
+                    if idx == int(key):
+                        break
+                    self.value()
+                    if self.expect(',]') == ']':
+                        raise KeyError(key)
+            else:
+                raise KeyError(key)
+        return
+
+    def items(self):
+        """
+        Iterate over ``(key, value)`` pairs of the dictionary (or list)
+        at the current position in the stream. For lists, the key
+        is ``_listitem``.
+        """
+        char = self.expect('[{')
+        close = ']' if char == '[' else '}'
+        if self.peek() == close:
+            self.expect(close)
+            return
+        while True:
+            if char == '{':
+                key = self.value()
+                self.expect(':')
+                yield key, self.value()
+            else:
+                yield _listitem, self.value()
+            if self.expect(',' + close) == close:
+                return
+
+
+def _iterjson(fh, keys, chunk_size):
+    """
+    Iterate over items at path in JSON stream.
+    """
+    stream = _jsonstream(fh, chunk_size=chunk_size)
+    stream.seek(keys)
+    for item in stream.items():
+        yield item
+    return
+
+
+def _iteryaml(fh, keys, loader):
+    """
+    Iterate over items at path in each document of a YAML stream. Items
+    are composed and constructed one at a time from the event stream.
+    """
+    loader = loader(fh)
+
+    def construct():
+        return loader.construct_document(loader.compose_node(None, None))
+
+    try:
+        loader.get_event()
+        while loader.check_event(yaml.DocumentStartEvent):
+            loader.get_event()
+
+            # seek
+            for key in keys:
+                if loader.check_event(yaml.MappingStartEvent):
+                    loader.get_event()
+                    while not loader.check_event(yaml.MappingEndEvent):
+                        if construct() == key:
+                            break
+                        loader.compose_node(None, None)
+                    else:
+                        raise KeyError(key)
+                elif loader.check_event(yaml.SequenceStartEvent):
+                    loader.get_event()
+                    for idx in range(int(key)):
+                        if loader.check_event(yaml.SequenceEndEvent):
+                            raise KeyError(key)
+                        loader.compose_node(None, None)
+                    if loader.check_event(yaml.SequenceEndEvent):
+                        raise KeyError(key)
+                else:
+                    raise KeyError(key)
+
+            # iterate
+            if loader.check_event(yaml.MappingStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.MappingEndEvent):
+                    key = construct()
+                    yield key, construct()
+            elif loader.check_event(yaml.SequenceStartEvent):
+                loader.get_event()
+                while not loader.check_event(yaml.SequenceEndEvent):
+                    yield _listitem, construct()
+            else:
+                raise ValueError('Cannot iterate over scalar YAML value')
+
+            # skip rest of document
+            while not loader.check_event(yaml.DocumentEndEvent):
+                loader.get_event()
+            loader.get_event()
+            loader.anchors = {}
+    finally:
+        loader.dispose()
+    return
+
+
+# paths
+# -----
+class _digits(str):
+    """
+    Dot-separated path component made of digits, which works as a key
+    for dictionaries and as an index for lists (i.e. ``'three.2'``).
+    """
+
+    def __index__(self):
+        return int(str(self))
+
+
+# components of path strings (``name``, ``[0]`` or ``['name']``)
+_PATH_TOKENS = re.compile(r'''\.?([^.\[\]'"]+)|\[(-?\d+)\]|\[(['"])(.*?)\3\]''')
+
+
+# cache of compiled path accessors, cleared when full (like the re module)
+_PATHS = {}
+_PATHS_MAX = 512
+
+
+def _parse_path(path):
+    """
+    Split path string (i.e. ``'four.five[1]'``) into tuple of keys.
+    Lists and tuples of keys are used as-is.
+    """
+    if isinstance(path, (list, tuple)):
+        return tuple(path)
+    keys, pos = [], 0
+    while pos < len(path):
+        match = _PATH_TOKENS.match(path, pos)
+        if match is None:
+            raise ValueError('Invalid path: {}'.format(path))
+        name, index, quote, quoted = match.groups()
+        if name is not None:
+            keys.append(_digits(name) if name.isdigit() else name)
+        elif index is not None:
+            keys.append(int(index))
+        else:
+            keys.append(quoted)
+        pos = match.end()
+    return tuple(keys)
+
+
+class _pathaccessor(object):
+    """
+    Reusable getter/setter for a path into composite objects (or plain
+    nested data), created with :meth:`composite.compile_path`. The path
+    is parsed once, and applying it only walks the stored keys.
+
+    Args:
+        path (str, list): Path string (i.e. ``'four.five[1]'``) or list of keys.
+    """
+    __slots__ = ('path', 'keys')
+
+    def __init__(self, path):
+        self.path = path
+        self.keys = _parse_path(path)
+        return
+
+    def __repr__(self):
+        return '{}({!r})'.format(type(self).__name__, self.path)
+
+    def walk(self, data, keys):
+        for key in keys:
+            if isinstance(data, composite):
+                data = data._resolve(key) if data._lazy else data._data[key]
+            else:
+                data = data[key]
+        return data
+
+    def get(self, data, default=_missing):
+        """
+        Return value at path in data, or ``default`` if the path doesn't
+        exist. Without a default, missing paths raise a ``KeyError``.
+
+        Args:
+            data (composite): Data to get value from.
+            default (object): Value to return for missing paths.
+        """
+        try:
+            # same as walk(), inlined for speed
+            for key in self.keys:
+                if isinstance(data, composite):
+                    data = data._resolve(key) if data._lazy else data._data[key]
+                else:
+                    data = data[key]
+            return data
+        except (KeyError, IndexError, TypeError):
+            if default is not _missing:
+                return default
+            raise KeyError(self.path)
+
+    __call__ = get
+
+    def set(self, data, value):
+        """
+        Set value at path in data. All but the last key in the path
+        must already exist.
+
+        Args:
+            data (composite): Data to set value in.
+            value (object): Value to set.
+        """
+        if not self.keys:
+            raise AssertionError('Cannot set value for empty path!')
+        try:
+            parent = self.walk(data, self.keys[:-1])
+        except (KeyError, IndexError, TypeError):
+            raise KeyError(self.path)
+        parent[self.keys[-1]] = value
+        return
+
+    def map(self, items, default=_missing):
+        """
+        Return list with value at path for each item in ``items``.
+
+        Args:
+            items (list): Items (i.e. list composite) to get values from.
+            default (object): Value to use for missing paths.
+        """
+        get = self.get
+        return [get(item, default) for item in items]
+
+
+def _accessor(path):
+    """
+    Return (cached) accessor for path.
+    """
+    if isinstance(path, _pathaccessor):
+        return path
+    if isinstance(path, (list, tuple)):
+        return _pathaccessor(path)
+    try:
+        return _PATHS[path]
+    except KeyError:
+        if len(_PATHS) >= _PATHS_MAX:
+            _PATHS.clear()
+        accessor = _PATHS[path] = _pathaccessor(path)
+        return accessor
+
+
+# components of query strings, in addition to path components
+# (``..``, ``*``, ``[*]`` and ``[?field]`` or ``[?field op value]``)
+_QUERY_TOKENS = re.compile(r'''
+    (?P<descend>\.\.)
+  | \.?(?:\*|\[\*\])
+  | \[\?\s*(?P<field>(?:[^\s\[\]=!<>]+|\[[^\]]*\])+)\s*
+      (?:(?P<op>==|!=|<=|>=|<|>)\s*(?P<value>"(?:[^"\\]|\\.)*"|'[^']*'|[^\]]+?)\s*)?\]
+''', re.VERBOSE)
+
+
+# comparison operators for query predicates
+_OPERATORS = {
+    '==': _equal,
+    '!=': lambda left, right: not _equal(left, right),
+    '<': lambda left, right: left < right,
+    '<=': lambda left, right: left <= right,
+    '>': lambda left, right: left > right,
+    '>=': lambda left, right: left >= right,
+}
+
+
+# cache of parsed queries, cleared when full
+_QUERIES = {}
+
+
+def _parse_query(query):
+    """
+    Split query string into tuple of ``(step, argument)`` pairs. Runs of
+    plain path components are combined into a single ``'path'`` step.
+    """
+    try:
+        return _QUERIES[query]
+    except KeyError:
+        pass
+    steps, keys, pos = [], [], 0
+    while pos < len(query):
+        match = _QUERY_TOKENS.match(query, pos)
+        if match is None:
+            match = _PATH_TOKENS.match(query, pos)
+            if match is None:
+                raise ValueError('Invalid query: {}'.format(query))
+            keys.extend(_parse_path(match.group(0)))
+            pos = match.end()
+            continue
+        if keys:
+            steps.append(('path', _pathaccessor(tuple(keys))))
+            keys = []
+        if match.group('descend'):
+            steps.append(('descend', None))
+        elif match.group('field'):
+            value = match.group('value')
+            if value is not None:
+                if value.startswith("'"):
+                    value = value[1:-1]
+                else:
+                    try:
+                        value = json.loads(value)
+                    except ValueError:
+                        raise ValueError('Invalid value in query: {}'.format(value))
+            steps.append(('filter', (_accessor(match.group('field')), match.group('op'), value)))
+        else:
+            steps.append(('all', None))
+        pos = match.end()
+    if keys:
+        steps.append(('path', _pathaccessor(tuple(keys))))
+    if len(_QUERIES) >= _PATHS_MAX:
+        _QUERIES.clear()
+    steps = _QUERIES[query] = tuple(steps)
+    return steps
+
+
+def _children(value):
+    """
+    Iterate over children of composite object or raw container,
+    wrapping children of lazy composite objects on access.
+    """
+    if isinstance(value, composite):
+        store = value._data
+        for key in (range(len(store)) if value._kind == _LIST else store):
+            yield value._resolve(key)
+    elif isinstance(value, dict):
+        for key in value:
+            yield value[key]
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield item
+    return
+
+
+def _matches(value, predicate):
+    """
+    Check if value matches query predicate.
+    """
+    accessor, op, expected = predicate
+    try:
+        field = accessor.get(value)
+    except KeyError:
+        return False
+    if op is None:
+        return True
+    try:
+        return _OPERATORS[op](field, expected)
+    except TypeError:
+        return False
+
+
+def _select(value, steps, idx=0):
+    """
+    Lazily evaluate query steps (starting from ``idx``) against value.
+    """
+    if idx == len(steps):
+        yield value
+        return
+    step, arg = steps[idx]
+    if step == 'path':
+        try:
+            value = arg.get(value)
+        except KeyError:
+            return
+        for item in _select(value, steps, idx + 1):
+            yield item
+    elif step == 'all':
+        for child in _children(value):
+            for item in _select(child, steps, idx + 1):
+                yield item
+    elif step == 'filter':
+        for child in _children(value):
+            if _matches(child, arg):
+                for item in _select(child, steps, idx + 1):
+                    yield item
+    elif step == 'descend':
+        for item in _select(value, steps, idx + 1):
+            yield item
+        for child in _children(value):
+            for item in _select(child, steps, idx):
+                yield item
+    return
+
+
+# diffs
+# -----
+def _pointer(path, key):
+    """
+    Return JSON pointer (RFC 6901) for key below path.
+    """
+    return path + '/' + str(key).replace('~', '~0').replace('/', '~1')
+
+
+def _parse_pointer(pointer):
+    """
+    Split JSON pointer (RFC 6901) into list of unescaped keys.
+    """
+    if pointer == '':
+        return []
+    if not pointer.startswith('/'):
+        raise AssertionError('Cannot parse patch path `{}`!'.format(pointer))
+    return [key.replace('~1', '/').replace('~0', '~') for key in pointer[1:].split('/')]
+
+
+def _pointer_key(store, key):
+    """
+    Return key in dictionary store for unescaped JSON pointer token,
+    resolving tokens for non-string keys (which are stringified in
+    pointers) against the existing keys.
+    """
+    if key in store:
+        return key
+    for item in store:
+        if not isinstance(item, basestring) and str(item) == key:
+            return item
+    return key
+
+
+def _diff(left, right, path, ops):
+    """
+    Walk nested data simultaneously, appending operations (RFC 6902)
+    that change left into right. Subtrees shared by both sides are
+    skipped without walking them. For lists, matching items at the
+    start and end are skipped, so inserting or removing a few items
+    doesn't replace everything after them.
+    """
+    if left is right:
+        return
+    if isinstance(left, composite):
+        left = left._data
+    if isinstance(right, composite):
+        right = right._data
+    if left is right:
+        return
+
+    if isinstance(left, dict) and isinstance(right, dict):
+        for key in left:
+            if key not in right:
+                ops.append({'op': 'remove', 'path': _pointer(path, key)})
+        for key in right:
+            if key not in left:
+                ops.append({'op': 'add', 'path': _pointer(path, key), 'value': _plain(right[key])})
+            else:
+                _diff(left[key], right[key], _pointer(path, key), ops)
+
+    elif isinstance(left, (list, tuple)) and isinstance(right, (list, tuple)):
+        start, lend, rend = 0, len(left), len(right)
+        while start < lend and start < rend and _equal(left[start], right[start]):
+            start += 1
+        while lend > start and rend > start and _equal(left[lend - 1], right[rend - 1]):
+            lend, rend = lend - 1, rend - 1
+        common = min(lend, rend) - start
+        for idx in range(start, start + common):
+            _diff(left[idx], right[idx], _pointer(path, idx), ops)
+        for idx in range(start + common, rend):
+            ops.append({'op': 'add', 'path': _pointer(path, idx), 'value': _plain(right[idx])})
+        for idx in range(start + common, lend):
+            ops.append({'op': 'remove', 'path': _pointer(path, start + common)})
+
+    elif not _equal(left, right):
+        ops.append({'op': 'replace', 'path': path, 'value': _plain(right)})
+    return
+
+
+# columns
+# -------
+def _numpy():
+    """
+    Return numpy module, which is only imported for columnar conversion.
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise AssertionError('Cannot convert columns without numpy installed!')
+    return numpy
+
+
+def _numpy_column(values, wrap):
+    """
+    Return numpy array for column of values, inferring type. Booleans
+    and (64-bit) numbers are stored in typed arrays, and anything else
+    (including None) in object arrays. Values missing from records
+    (``_missing``) are masked in a numpy masked array, so that columns
+    keep their type, and missing values aren't confused with None.
+    """
+    numpy = _numpy()
+    mask = [value is _missing for value in values]
+    missing = any(mask)
+    types = set(type(value) for value in values if value is not _missing)
+    if missing:
+        values = [None if flag else value for value, flag in zip(values, mask)]
+
+    column = None
+    if types and types <= set([bool]):
+        column = numpy.array([bool(value) for value in values], dtype=bool)
+    elif types and types <= set([int, long]):
+        try:
+            column = numpy.array([value or 0 for value in values], dtype=numpy.int64)
+        except OverflowError:
+            pass
+    elif types and types <= set([int, long, float]):
+        # integers that don't fit in 64 bits aren't converted to floats
+        if types == set([float]) or all(-2 ** 63 <= value < 2 ** 63 for value in values if type(value) in (int, long)):
+            column = numpy.array([value or 0 for value in values], dtype=numpy.float64)
+
+    # assigned one by one, so nested items aren't unpacked into dimensions
+    if column is None:
+        column = numpy.empty(len(values), dtype=object)
+        for idx, value in enumerate(values):
+            column[idx] = wrap(value) if isinstance(value, (dict, list, tuple)) else value
+    return numpy.ma.array(column, mask=mask) if missing else column
+
+
+def _column_values(column):
+    """
+    Return list of python values for numpy or arrow array (or other
+    sequence), with ``_missing`` for masked (or null arrow) values.
+    Composite objects in object arrays and lists are copied on write
+    (see :meth:`composite._borrow`), so they aren't shared with the column.
+    """
+    if hasattr(column, 'to_pylist'):
+        return [_missing if value is None else value for value in column.to_pylist()]
+    elif hasattr(column, 'tolist'):
+        values = column.tolist()
+        mask = getattr(column, 'mask', None)
+        if getattr(mask, 'shape', None):
+            values = [_missing if flag else value for value, flag in zip(values, mask.tolist())]
+        if getattr(column, 'dtype', None) != object:
+            return values
+    else:
+        values = list(column)
+    return [value._borrow() if isinstance(value, composite) else value for value in values]
+
+
+# parallel
+# --------
+def _executor(executor, workers=None):
+    """
+    Return ``(executor, owned)`` for executor name (``'thread'`` or
+    ``'process'``) or instance of ``concurrent.futures.Executor``.
+    Executors created here are owned by the caller, and should be
+    shut down after use.
+    """
+    from concurrent import futures
+    if executor == 'thread':
+        return futures.ThreadPoolExecutor(workers), True
+    elif executor == 'process':
+        return futures.ProcessPoolExecutor(workers), True
+    elif isinstance(executor, futures.Executor):
+        return executor, False
+    raise AssertionError('Unsupported executor: {}'.format(executor))
+
+
+def _batches(items, batch_size):
+    """
+    Split list into consecutive batches.
+    """
+    return [items[idx:idx + batch_size] for idx in range(0, len(items), batch_size)]
+
+
+def _load_path(cls, path, lazy=False, format=None, safe=False, cache=None, cache_size=None):
+    """
+    Load file at path, opening binary formats in binary mode.
+    """
+    binary = (format or _sniff_format(name=path)) in _BINARY_FORMATS
+    with open(path, 'rb' if binary else 'r') as fh:
+        return cls.load(fh, lazy=lazy, format=format, safe=safe, cache=cache, cache_size=cache_size)
+
+
+def _load_raw(path, format=None, safe=False, cache=None, cache_size=None):
+    """
+    Load file into raw nested data (in executors for loading many
+    files, which return plain data instead of composite objects).
+    """
+    return _load_path(composite, path, lazy=True, format=format, safe=safe, cache=cache, cache_size=cache_size)._data
+
+
+def _write_path(obj, path, pretty=True, format=None):
+    """
+    Write composite object to file at path, in format detected from
+    the file extension (json by default).
+    """
+    format = format or _sniff_format(name=path) or 'json'
+    if format in _BINARY_FORMATS:
+        with open(path, 'wb') as fh:
+            obj.write_binary(fh, format=format)
+    elif format == 'yaml':
+        with open(path, 'w') as fh:
+            obj.write_yaml(fh)
+    elif format == 'json':
+        with open(path, 'w') as fh:
+            obj.write_json(fh, pretty=pretty)
+    else:
+        raise AssertionError('Unsupported format for write: {}'.format(format))
+    return
+
+
+def _run_async(executor, func):
+    """
+    Run callable in executor (or the default executor of the event
+    loop), returning asyncio future for the result.
+    """
+    import asyncio
+    try:
+        loop = asyncio.get_running_loop()
+    except (AttributeError, RuntimeError):
+        loop = asyncio.get_event_loop()
+    return loop.run_in_executor(executor, func)
+
+
+def _map_batch(func, items):
+    return [func(item) for item in items]
+
+
+def _filter_batch(func, items):
+    return [bool(func(item)) for item in items]
+
+
+# caching
+# -------
+# version of cache entries, which changes whenever the layout of stored
+# data changes, so that entries from older versions are ignored
+_CACHE_VERSION = 1
+
+# default size limit (in bytes) of cache directories
+_CACHE_SIZE = 2 ** 28
+
+# suffix of cache entries (other files in cache directories are ignored)
+_CACHE_SUFFIX = '.gemcache'
+
+
+def _cache_entry(cache, path, format=None, safe=False):
+    """
+    Return path of cache entry for file. Entries are keyed by the
+    absolute path, modification time, size and inode of the file, so
+    changed files get new entries, and by options that change parsed data.
+    """
+    stat = os.stat(path)
+    key = repr((
+        _CACHE_VERSION, sys.version_info[0], os.path.abspath(path),
+        getattr(stat, 'st_mtime_ns', stat.st_mtime), stat.st_size, stat.st_ino,
+        format, bool(safe),
+    ))
+    return os.path.join(cache, hashlib.sha1(key.encode('utf-8')).hexdigest() + _CACHE_SUFFIX)
+
+
+def _cache_read(entry):
+    """
+    Return data stored in cache entry (or _missing), and mark entry as
+    recently used. Unreadable entries are removed.
+    """
+    try:
+        with open(entry, 'rb') as fh:
+            data = pickle.load(fh)
+    except (IOError, OSError):
+        return _missing
+    except Exception:
+        try:
+            os.remove(entry)
+        except OSError:
+            pass
+        return _missing
+    try:
+        os.utime(entry, None)
+    except OSError:
+        pass
+    return data
+
+
+def _cache_write(entry, data, cache_size=None):
+    """
+    Store data in cache entry, then evict least recently used entries
+    until the cache directory is within its size limit. Entries are
+    written to a temporary file and moved into place, so concurrent
+    readers never see partial entries. Caching is best-effort, so data
+    that can't be stored (or cache directories that can't be written)
+    are skipped.
+    """
+    try:
+        payload = pickle.dumps(data, pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        return
+    directory, temp = os.path.dirname(entry), None
+    try:
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        fd, temp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(payload)
+        _replace(temp, entry)
+        temp = None
+        _cache_evict(directory, _CACHE_SIZE if cache_size is None else cache_size)
+    except (IOError, OSError):
+        if temp is not None:
+            try:
+                os.remove(temp)
+            except OSError:
+                pass
+    return
+
+
+def _cache_evict(directory, cache_size):
+    """
+    Remove least recently used entries from cache directory until the
+    total size of entries is at most ``cache_size`` bytes.
+    """
+    entries = []
+    for name in os.listdir(directory):
+        if name.endswith(_CACHE_SUFFIX):
+            try:
+                stat = os.stat(os.path.join(directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, name, stat.st_size))
+    total = sum(size for _, _, size in entries)
+    for _, name, size in sorted(entries):
+        if total <= cache_size:
+            break
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            pass
+        total -= size
+    return
+
+
+# json backends
+# -------------
+def _encode_default(obj):
+    """
+    Fallback for json encoders, which serializes composite objects
+    through their internal store instead of a full copy via json().
+    """
+    if isinstance(obj, composite):
+        return obj._data
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(obj).__name__))
+
+
+def _stdlib_dumps(obj, pretty=False):
+    """
+    Encode data with the standard library json module.
+    """
+    if pretty:
+        return json.dumps(obj, sort_keys=True, indent=4, default=_encode_default)
+    return json.dumps(obj, default=_encode_default)
+
+
+def _floatstr(value):
+    """
+    Encode float the same way as the standard library json module.
+    """
+    if value != value:
+        return 'NaN'
+    elif value == float('inf'):
+        return 'Infinity'
+    elif value == -float('inf'):
+        return '-Infinity'
+    return float.__repr__(value)
+
+
+def _stdlib_dump(obj, fh, pretty=False, buffer_size=2048):
+    """
+    Stream data to file handle in the same format as the standard library
+    json module, walking the tree once and writing encoded chunks as they're
+    produced (instead of building the full string). Pending chunks are
+    flushed to the file handle once ``buffer_size`` of them accumulate.
+    """
+    chunks = []
+    append = chunks.append
+    quote = json.encoder.encode_basestring_ascii
+    separator = ',' if pretty else ', '
+
+    def key(value):
+        if isinstance(value, basestring):
+            return value
+        elif value is True:
+            return 'true'
+        elif value is False:
+            return 'false'
+        elif value is None:
+            return 'null'
+        elif isinstance(value, float):
+            return _floatstr(value)
+        elif isinstance(value, (int, long)):
+            return str(int(value))
+        raise TypeError('keys must be str, int, float, bool or None, not {}'.format(type(value).__name__))
+
+    def encode(value, level):
+        if isinstance(value, composite):
+            value = value._data
+        if isinstance(value, basestring):
+            append(quote(value))
+        elif value is None:
+            append('null')
+        elif value is True:
+            append('true')
+        elif value is False:
+            append('false')
+        elif isinstance(value, float):
+            append(_floatstr(value))
+        elif isinstance(value, (int, long)):
+            append(str(int(value)))
+        elif isinstance(value, (list, tuple, dict)):
+            mapping = isinstance(value, dict)
+            if not value:
+                append('{}' if mapping else '[]')
+                return
+            append('{' if mapping else '[')
+            if pretty:
+                indent = '\n' + ' ' * (4 * (level + 1))
+                append(indent)
+                delimiter = separator + indent
+            else:
+                delimiter = separator
+            first = True
+            for item in (sorted(value, key=key) if mapping and pretty else value):
+                if not first:
+                    append(delimiter)
+                first = False
+                if mapping:
+                    append(quote(key(item)))
+                    append(': ')
+                    item = value[item]
+                encode(item, level + 1)
+                if len(chunks) >= buffer_size:
+                    fh.write(''.join(chunks))
+                    del chunks[:]
+            if pretty:
+                append('\n' + ' ' * (4 * level))
+            append('}' if mapping else ']')
+        else:
+            encode(_encode_default(value), level)
+        return
+
+    encode(obj, 0)
+    fh.write(''.join(chunks))
+    return
+
+
+_JSON_BACKENDS = {
+    'json': (json.loads, _stdlib_dumps, _stdlib_dump),
+}
+
+# fastest backends first
+_JSON_PREFERENCE = ['orjson', 'ujson', 'simdjson', 'json']
+
+try:
+    import orjson
+
+    def _orjson_dumps(obj, pretty=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_SORT_KEYS | orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_encode_default, option=option).decode('utf-8')
+
+    _JSON_BACKENDS['orjson'] = (orjson.loads, _orjson_dumps, None)
+except ImportError:
+    pass
+
+try:
+    import ujson
+
+    def _ujson_dumps(obj, pretty=False):
+        if pretty:
+            return ujson.dumps(obj, sort_keys=True, indent=4, escape_forward_slashes=False, default=_encode_default)
+        return ujson.dumps(obj, escape_forward_slashes=False, default=_encode_default)
+
+    _JSON_BACKENDS['ujson'] = (ujson.loads, _ujson_dumps, None)
+except ImportError:
+    pass
+
+try:
+    import simdjson
+    _JSON_BACKENDS['simdjson'] = (simdjson.loads, _stdlib_dumps, _stdlib_dump)
+except ImportError:
+    pass
+
+
+def _json_backend(name=None):
+    """
+    Return ``(loads, dumps, dump)`` functions for json backend, defaulting
+    to the globally selected backend. The streaming ``dump`` function
+    may be None.
+    """
+    name = name or composite._json_backend
+    if name not in _JSON_BACKENDS:
+        raise AssertionError('Unsupported json backend: {}'.format(name))
+    return _JSON_BACKENDS[name]
+
+
+# binary formats
+# --------------
+_BINARY_FORMATS = {}
+
+try:
+    import msgpack
+
+    def _msgpack_dumps(obj):
+        return msgpack.packb(obj, default=_encode_default, use_bin_type=True)
+
+    def _msgpack_loads(data):
+        return msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+    _BINARY_FORMATS['msgpack'] = (_msgpack_loads, _msgpack_dumps)
+except ImportError:
+    pass
+
+try:
+    import cbor2
+
+    def _cbor_dumps(obj):
+        return cbor2.dumps(obj, default=lambda encoder, value: encoder.encode(_encode_default(value)))
+
+    _BINARY_FORMATS['cbor'] = (cbor2.loads, _cbor_dumps)
+except ImportError:
+    pass
+
+
+def _binary_format(name):
+    """
+    Return ``(loads, dumps)`` functions for binary format.
+    """
+    if name not in _BINARY_FORMATS:
+        raise AssertionError('Unsupported binary format: {} (is it installed?)'.format(name))
+    return _BINARY_FORMATS[name]
+
 
 # data management
 # ---------------
@@ -31,6 +1398,9 @@ class composite(object):
 
     Args:
         data (tuple, list, dict): Data to build composite datastructure from.
+        lazy (bool): Whether or not to defer wrapping nested dictionaries
+            and lists until they are accessed. For large documents, this
+            avoids walking (and copying) the entire input up front.
 
     Example:
         >>> data = composite({
@@ -44,112 +1414,659 @@ class composite(object):
         >>> data.two[0] == 1
         True
     """
+    __slots__ = ('_data', '_kind', '_lazy', '_shared', '_indexes')
+    _json_backend = 'json'
+    _nested = (list, tuple, dict)
 
-    def __init__(self, data):
-        self._list = []
-        self._dict = {}
-        self.meta_type = None
+    def __init__(self, data, lazy=False):
+        # internal attributes are set directly (skipping __setattr__),
+        # since this runs for every nested node
+        _setattr(self, '_lazy', lazy)
+        _setattr(self, '_shared', False)
 
         if hasattr(data, 'read'):
             data = json.load(data)
 
         if isinstance(data, (list, tuple)):
-            for dat in data:
-                if not isinstance(dat, (list, tuple, dict)):
-                    self._list.append(dat)
-                else:
-                    self._list.append(composite(dat))
-            self.meta_type = 'list'
+            _setattr(self, '_kind', _LIST)
+            _setattr(self, '_indexes', None)
+            if lazy:
+                _setattr(self, '_data', list(data))
+            else:
+                store = []
+                for dat in data:
+                    if not isinstance(dat, self._nested):
+                        store.append(dat)
+                    else:
+                        store.append(self._wrap(dat))
+                _setattr(self, '_data', store)
 
         elif isinstance(data, dict):
-            for key in data:
-                if not isinstance(data[key], (list, tuple, dict)):
-                    self._dict[key] = data[key]
-                else:
-                    self._dict[key] = composite(data[key])
-            self.meta_type = 'dict'
+            _setattr(self, '_kind', _DICT)
+            if lazy:
+                _setattr(self, '_data', dict(data))
+            else:
+                store = {}
+                for key in data:
+                    if not isinstance(data[key], self._nested):
+                        store[key] = data[key]
+                    else:
+                        store[key] = self._wrap(data[key])
+                _setattr(self, '_data', store)
 
         elif isinstance(data, composite):
-            self.meta_type = data.meta_type
-            if data.meta_type == 'dict':
-                self._dict = data._dict
-            elif data.meta_type == 'list':
-                self._list = data._list
+            self._kind = data._kind
+            self._lazy = data._lazy
+            self._data = data._data
+            self._indexes = None
+
+            # borrow (immutable) store of frozen composite objects, so
+            # that nested data are thawed as they're accessed
+            if isinstance(data, frozencomposite) and not isinstance(self, frozencomposite):
+                self._lazy = True
+                self._shared = _THAWED
 
         else:
             raise TypeError('unsupported type for creating composite: {}'.format(type(data)))
         return
 
+    @property
+    def meta_type(self):
+        """
+        Base type of object (``'list'`` or ``'dict'``).
+        """
+        return _KINDS[self._kind]
+
+    @property
+    def _dict(self):
+        return self._data if self._kind == _DICT else {}
+
+    @property
+    def _list(self):
+        return self._data if self._kind == _LIST else []
+
+    @classmethod
+    def register_json_backend(cls, name, loads, dumps, dump=None):
+        """
+        Register backend for parsing and encoding json data. Backends
+        for ``orjson``, ``ujson`` and ``simdjson`` are registered
+        automatically when those packages are installed.
+
+        Args:
+            name (str): Name of backend.
+            loads (callable): Function for parsing json string.
+            dumps (callable): Function with signature ``dumps(obj, pretty=False)``
+                for encoding data to json string. Composite objects are
+                passed through directly, so encoders should fall back to
+                their internal ``_data`` store.
+            dump (callable): Optional function with signature
+                ``dump(obj, fh, pretty=False)`` for streaming encoded data
+                to a file handle.
+
+        Examlple:
+            >>> composite.register_json_backend('rapidjson', rapidjson.loads, mydumps)
+            >>> composite.use_json_backend('rapidjson')
+        """
+        _JSON_BACKENDS[name] = (loads, dumps, dump)
+        return
+
+    @classmethod
+    def use_json_backend(cls, name=None):
+        """
+        Globally select backend for json parsing and encoding. By default,
+        the standard library ``json`` module is used. Individual calls can
+        also specify a backend via the ``backend=`` argument.
+
+        .. NOTE:: All backends produce equivalent data, but whitespace in
+            pretty-printed output may differ (``orjson`` only supports
+            indenting by two spaces).
+
+        Args:
+            name (str): Name of backend to use. If not specified, the fastest
+                installed backend is used.
+        """
+        if name is None:
+            name = [item for item in _JSON_PREFERENCE if item in _JSON_BACKENDS][0]
+        _json_backend(name)
+        composite._json_backend = name
+        return
+
+    @classmethod
+    def register_binary_format(cls, name, loads, dumps):
+        """
+        Register binary serialization format. The ``msgpack`` and ``cbor``
+        formats are registered automatically when the ``msgpack`` and
+        ``cbor2`` packages are installed.
+
+        Args:
+            name (str): Name of format.
+            loads (callable): Function for decoding bytes.
+            dumps (callable): Function for encoding data to bytes. Composite
+                objects are passed through directly, so encoders should fall
+                back to their internal ``_data`` store.
+
+        Examlple:
+            >>> composite.register_binary_format('bson', bson.decode, mydumps)
+            >>> data.write_binary(fh, format='bson')
+        """
+        _BINARY_FORMATS[name] = (loads, dumps)
+        return
+
+    @classmethod
+    def load(cls, fh, lazy=False, format=None, backend=None, safe=False, cache=None, cache_size=None):
+        """
+        Load json or yaml data from file handle. Unless a format is
+        specified, it's detected up front from the file extension and
+        content, so only one parser is used.
+
+        Args:
+            fh (file): File handle to load from.
+            lazy (bool): Whether or not to wrap nested data on first access.
+            format (str): Format of data in file handle (``'json'`` or ``'yaml'``).
+            backend (str): Name of json backend to use.
+            safe (bool): Whether or not to only construct standard yaml tags.
+            cache (str): Directory to cache parsed data in. Files that haven't
+                changed (by modification time and size) since they were
+                cached are loaded from the cache instead of parsed. Entries
+                are unpickled, which can run arbitrary code, so the directory
+                must only be writable by trusted users. Failures to write
+                entries are ignored.
+            cache_size (int): Size limit (in bytes) of the cache directory,
+                after which least recently used entries are removed
+                (256 MB by default).
+
+        Examlple:
+            >>> with open('data.json', 'r') as json:
+            >>>    jsdata = composite.load(json)
+            >>>
+            >>> with open('data.yml', 'r') as yml:
+            >>>    ymldata = composite.load(yml, cache=os.path.expanduser('~/.cache/myapp'))
+        """
+        name = getattr(fh, 'name', None)
+        if cache is not None and isinstance(name, basestring) and os.path.isfile(name):
+            entry = _cache_entry(cache, name, format=format, safe=safe)
+            data = _cache_read(entry)
+            if data is _missing:
+                data = composite.load(fh, lazy=True, format=format, backend=backend, safe=safe)._data
+                _cache_write(entry, data, cache_size)
+            return cls(data, lazy=lazy)
+
+        dat = fh.read()
+        if format is None:
+            format = _sniff_format(dat, name=getattr(fh, 'name', None))
+        if format == 'json':
+            return cls.from_json(dat, lazy=lazy, backend=backend)
+        elif format == 'yaml':
+            return cls.from_yaml(dat, lazy=lazy, safe=safe)
+        elif format in _BINARY_FORMATS:
+            return cls.from_binary(dat, format=format, lazy=lazy)
+        else:
+            raise AssertionError('Unsupported format for load: {}'.format(format))
+
+    @classmethod
+    def load_many(cls, paths, workers=None, executor='process', merge=False, overwrite=True,
+                  lazy=False, format=None, safe=False, cache=None, cache_size=None):
+        """
+        Load many json or yaml files concurrently. Files are parsed by
+        a pool of workers, and returned as composite objects keyed by
+        path, or merged into a single composite object.
+
+        Args:
+            paths (list): Paths of files to load.
+            workers (int): Number of workers for pools created by name.
+            executor (str, Executor): Parse files in a ``'process'`` pool
+                (best for yaml, which is parsed in python), ``'thread'``
+                pool, or existing ``concurrent.futures`` executor. If None,
+                files are loaded serially.
+            merge (bool): Whether or not to merge all files with :meth:`union`,
+                one after another in order.
+            overwrite (bool): Whether or not values in later files overwrite
+                values in earlier files when merging (see :meth:`union`).
+            lazy (bool): Whether or not to wrap nested data on first access.
+            format (str): Format of files (by default, detected for each file).
+            safe (bool): Whether or not to only construct standard yaml tags.
+            cache (str): Directory to cache parsed data in (see :meth:`load`).
+            cache_size (int): Size limit (in bytes) of the cache directory.
+
+        Examlple:
+            >>> configs = composite.load_many(glob.glob('conf.d/*.yml'), workers=8)
+            >>> config = composite.load_many(sorted(glob.glob('conf.d/*.yml')), merge=True)
+        """
+        paths = list(paths)
+        if executor is None:
+            raw = [_load_raw(path, format=format, safe=safe, cache=cache, cache_size=cache_size) for path in paths]
+        else:
+            executor, owned = _executor(executor, workers)
+            try:
+                count = len(paths)
+                raw = list(executor.map(
+                    _load_raw, paths, [format] * count, [safe] * count, [cache] * count, [cache_size] * count
+                ))
+            finally:
+                if owned:
+                    executor.shutdown()
+        results = [cls(data, lazy=lazy) for data in raw]
+        if not merge:
+            return dict(zip(paths, results))
+
+        # unions aren't associative (i.e. values of different types are
+        # combined into lists), so files are merged in order
+        if not results:
+            return cls({}, lazy=lazy)
+        merged = results[0]
+        for result in results[1:]:
+            merged = merged.union(result, overwrite=overwrite)
+        return cls(merged._data, lazy=lazy) if len(results) > 1 else merged
+
+    @classmethod
+    def aload(cls, path, lazy=False, format=None, safe=False, executor=None, cache=None, cache_size=None):
+        """
+        Load json or yaml file without blocking the asyncio event loop.
+        Reading and parsing run in an executor, and the returned future
+        can be awaited for the composite object.
+
+        Args:
+            path (str): Path of file to load.
+            lazy (bool): Whether or not to wrap nested data on first access.
+            format (str): Format of file (by default, detected from the file).
+            safe (bool): Whether or not to only construct standard yaml tags.
+            executor (Executor): Executor to run in (i.e. a process pool for
+                large yaml files). By default, the default executor of the
+                event loop is used.
+            cache (str): Directory to cache parsed data in (see :meth:`load`).
+            cache_size (int): Size limit (in bytes) of the cache directory.
+
+        Examlple:
+            >>> data = await composite.aload('config.yml')
+        """
+        return _run_async(executor, functools.partial(
+            _load_path, cls, path, lazy=lazy, format=format, safe=safe,
+            cache=cache, cache_size=cache_size
+        ))
+
+    @classmethod
+    def aload_many(cls, paths, workers=8, executor='thread', merge=False, overwrite=True,
+                   lazy=False, format=None, safe=False, cache=None, cache_size=None):
+        """
+        Load many files without blocking the asyncio event loop (see
+        :meth:`load_many`). At most ``workers`` files are loaded at a time.
+
+        Examlple:
+            >>> configs = await composite.aload_many(glob.glob('conf.d/*.yml'), workers=4)
+        """
+        return _run_async(None, functools.partial(
+            cls.load_many, paths, workers=workers, executor=executor, merge=merge,
+            overwrite=overwrite, lazy=lazy, format=format, safe=safe,
+            cache=cache, cache_size=cache_size
+        ))
+
+    @classmethod
+    def from_json(cls, fh, lazy=False, backend=None):
+        """
+        Load json from file handle.
+
+        Args:
+            fh (file): File handle (or string or bytes) to load from.
+            lazy (bool): Whether or not to wrap nested data on first access.
+            backend (str): Name of json backend to use.
+
+        Examlple:
+            >>> with open('data.json', 'r') as json:
+            >>>    data = composite.load(json)
+        """
+        loads = _json_backend(backend)[0]
+        if isinstance(fh, (basestring, bytes)):
+            return cls(loads(fh), lazy=lazy)
+        else:
+            return cls(loads(fh.read()), lazy=lazy)
+
+    @classmethod
+    def from_yaml(cls, fh, lazy=False, safe=False):
+        """
+        Load yaml from file handle. The C-accelerated libyaml loader
+        is used when available.
+
+        Args:
+            fh (file): File handle to load from.
+            lazy (bool): Whether or not to wrap nested data on first access.
+            safe (bool): Whether or not to only construct standard yaml tags
+                (i.e. no python-specific objects).
+
+        Examlple:
+            >>> with open('data.yml', 'r') as json:
+            >>>    data = composite.load(json)
+        """
+        loader = YAMLSafeLoader if safe else YAMLLoader
+        return cls(yaml.load(fh, Loader=loader), lazy=lazy)
+
+    @classmethod
+    def from_binary(cls, fh, format='msgpack', lazy=False):
+        """
+        Load data in binary format from file handle or bytes.
+
+        Args:
+            fh (file, bytes): File handle (opened in binary mode) or bytes
+                to load from.
+            format (str): Name of binary format (see :meth:`register_binary_format`).
+            lazy (bool): Whether or not to wrap nested data on first access.
+
+        Examlple:
+            >>> with open('data.msgpack', 'rb') as fi:
+            >>>    data = composite.from_binary(fi, format='msgpack')
+        """
+        loads = _binary_format(format)[0]
+        if isinstance(fh, (bytes, bytearray, memoryview)):
+            return cls(loads(fh), lazy=lazy)
+        return cls(loads(fh.read()), lazy=lazy)
+
+    @classmethod
+    def from_msgpack(cls, fh, lazy=False):
+        """
+        Load MessagePack data from file handle or bytes. Requires
+        the ``msgpack`` package.
+
+        Args:
+            fh (file, bytes): File handle (opened in binary mode) or bytes
+                to load from.
+            lazy (bool): Whether or not to wrap nested data on first access.
+        """
+        return cls.from_binary(fh, format='msgpack', lazy=lazy)
+
+    @classmethod
+    def from_cbor(cls, fh, lazy=False):
+        """
+        Load CBOR data from file handle or bytes. Requires the
+        ``cbor2`` package.
+
+        Args:
+            fh (file, bytes): File handle (opened in binary mode) or bytes
+                to load from.
+            lazy (bool): Whether or not to wrap nested data on first access.
+        """
+        return cls.from_binary(fh, format='cbor', lazy=lazy)
+
+    @classmethod
+    def from_columns(cls, columns, lazy=False):
+        """
+        Create list of records from dictionary of columns (i.e. numpy or
+        arrow arrays, or lists) of the same length. This is the reverse
+        of :meth:`to_columns`: masked values in numpy masked arrays (and
+        nulls in arrow arrays) are left out of records.
+
+        Args:
+            columns (dict): Dictionary of column names and values.
+            lazy (bool): Whether or not to wrap nested data on first access.
+
+        Examlple:
+            >>> data = composite.from_columns({'id': numpy.array([1, 2]), 'name': ['one', 'two']})
+            >>> print data
+            [{'id': 1, 'name': 'one'}, {'id': 2, 'name': 'two'}]
+        """
+        names = list(columns)
+        values = [_column_values(columns[name]) for name in names]
+        if len(set(map(len, values))) > 1:
+            raise AssertionError('Cannot create records from columns of different lengths!')
+        return cls([
+            {name: value for name, value in zip(names, row) if value is not _missing}
+            for row in zip(*values)
+        ], lazy=lazy)
+
     @classmethod
-    def load(cls, fh):
+    def iterload(cls, fh, path=None, format=None, chunk_size=65536, lazy=False, safe=False):
         """
-        Load json or yaml data from file handle.
+        Incrementally load json or yaml data from file handle, yielding
+        items of the list (or ``(key, value)`` pairs of the dictionary) at
+        the specified path as soon as they finish parsing. Only the item
+        currently being parsed is held in memory, so this can be used
+        for documents that are too large to load at once.
+
+        .. NOTE:: Iteration stops once the list or dictionary at the
+            specified path is exhausted, so the remainder of the document
+            isn't validated. For yaml streams with multiple documents,
+            items at the specified path are yielded for every document.
 
         Args:
             fh (file): File handle to load from.
+            path (str): Dot-separated path to list or dictionary to iterate
+                over (i.e. ``'data.items'``). Integer path components index
+                into lists. By default, the top-level object is used.
+            format (str): Format of data in file handle (``'json'`` or ``'yaml'``).
+                By default, this is detected from the file name or first chunk
+                of content.
+            chunk_size (int): Number of characters to read from the file
+                handle at a time (json only).
+            lazy (bool): Whether or not to wrap nested data on first access.
+            safe (bool): Whether or not to only construct standard yaml tags.
 
         Examlple:
-            >>> with open('data.json', 'r') as json:
-            >>>    jsdata = composite.load(json)
-            >>>
-            >>> with open('data.yml', 'r') as yml:
-            >>>    ymldata = composite.load(yml)
+            >>> with open('export.json', 'r') as fi:
+            >>>     for item in composite.iterload(fi, path='items'):
+            >>>         print item.name
         """
-        dat = fh.read()
-        try:
-            ret = cls.from_json(dat)
-        except Exception:
-            ret = cls.from_yaml(dat)
-        return ret
+        keys = path.split('.') if path else []
+        if format is None:
+            format = _sniff_stream(fh)
+        if format == 'json':
+            items = _iterjson(fh, keys, chunk_size=chunk_size)
+        elif format == 'yaml':
+            # pure-python loaders expose nodes one at a time
+            items = _iteryaml(fh, keys, loader=yaml.SafeLoader if safe else yaml.FullLoader)
+        else:
+            raise AssertionError('Unsupported format for iterload: {}'.format(format))
+
+        def wrap(value):
+            if isinstance(value, (list, tuple, dict)):
+                return cls(value, lazy=lazy)
+            return value
+
+        for key, value in items:
+            if key is _listitem:
+                yield wrap(value)
+            else:
+                yield key, wrap(value)
+        return
 
     @classmethod
-    def from_json(cls, fh):
+    def from_string(cls, string, lazy=False, format=None, backend=None):
         """
-        Load json from file handle.
+        Load data from string in json, yaml or python literal (i.e.
+        ``str(data)``) syntax. Strings are never evaluated as code, so
+        this is safe for untrusted input.
 
         Args:
-            fh (file): File handle to load from.
+            string (str): String to load from.
+            lazy (bool): Whether or not to wrap nested data on first access.
+            format (str): Format of string (``'json'``, ``'yaml'`` or
+                ``'python'``). By default, the format is detected: strings
+                that look like json are parsed as json, then as python
+                literals, and everything else is parsed as yaml (with the
+                safe loader).
+            backend (str): Name of json backend to use.
 
         Examlple:
             >>> with open('data.json', 'r') as json:
-            >>>    data = composite.load(json)
+            >>>     jdat = json.read()
+            >>> data = composite.from_string(jdat)
+            >>> data = composite.from_string(str({'one': 1, 'two': [1, 2]}))
         """
-        if isinstance(fh, str):
-            return cls(json.loads(fh))
-        else:
-            return cls(json.load(fh))
+        if isinstance(string, bytes) and not isinstance(string, str):
+            string = string.decode('utf-8')
+        detect = format is None
+        if detect:
+            format = _sniff_format(string)
+            if format == 'yaml' and re.match(r"\s*[({\[']", string):
+                format = 'python'
+
+        # detected formats fall through to the next candidate
+        if format == 'json':
+            try:
+                return cls(_json_backend(backend)[0](string), lazy=lazy)
+            except ValueError:
+                if not detect:
+                    raise
+                format = 'python'
+        if format == 'python':
+            try:
+                return cls(_parse_literal(string), lazy=lazy)
+            except (ValueError, SyntaxError):
+                if not detect:
+                    raise
+                format = 'yaml'
+        if format == 'yaml':
+            return cls(yaml.load(string, Loader=YAMLSafeLoader), lazy=lazy)
+        raise AssertionError('Unsupported format for from_string: {}'.format(format))
 
     @classmethod
-    def from_yaml(cls, fh):
+    def open_snapshot(cls, path):
         """
-        Load yaml from file handle.
+        Open snapshot file written by :meth:`save_snapshot`. The file is
+        memory-mapped, and nested data are decoded the first time they're
+        accessed, so opening a snapshot is near-instant regardless of size,
+        and processes opening the same file share its memory.
 
         Args:
-            fh (file): File handle to load from.
+            path (str): Path to snapshot file.
+
+        Returns:
+            Read-only (frozen) composite object.
 
         Examlple:
-            >>> with open('data.yml', 'r') as json:
-            >>>    data = composite.load(json)
+            >>> data = composite.open_snapshot('catalog.snap')
+            >>> data['items'][42].name
+            'Item number 42'
+        """
+        with open(path, 'rb') as fh:
+            buffer = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[:len(_SNAPSHOT_MAGIC)] != _SNAPSHOT_MAGIC:
+            buffer.close()
+            raise AssertionError('Cannot open {} as snapshot!'.format(path))
+        root = struct.unpack_from('<Q', buffer, len(_SNAPSHOT_MAGIC))[0]
+        return _snapshot_value((buffer, {}), root)
+
+    def _wrap(self, value, lazy=False):
         """
-        return cls(yaml.load(fh, Loader=yaml.FullLoader))
+        Return composite object for nested data.
+        """
+        return type(self)(value, lazy=lazy)
 
-    @classmethod
-    def from_string(cls, string):
+    def _resolve(self, key):
+        """
+        Return child from internal store, wrapping (and caching) raw
+        nested data for lazy composite objects. Stores shared with other
+        composite objects are detached before nested children are handed
+        out (see :meth:`_detach`).
+        """
+        value = self._data[key]
+        if not self._lazy:
+            return value
+        if self._shared and isinstance(value, (composite,) + self._nested):
+            self._detach()
+            value = self._data[key]
+        if not isinstance(value, self._nested):
+            return value
+        store = self._data
+        store[key] = self._wrap(value, lazy=True)
+
+        # keep indexes pointing to the objects in the store
+        if self._kind == _LIST and self._indexes:
+            for accessor, index in self._indexes.values():
+                index.replace(accessor.get(value, None), value, store[key])
+        return store[key]
+
+    def _expand(self):
+        """
+        Wrap all direct children of lazy composite objects, so that
+        the internal store only contains composite objects and scalars.
+        """
+        if not self._lazy:
+            return
+        if self._kind == _LIST:
+            for idx in range(len(self._data)):
+                self._resolve(idx)
+        else:
+            for key in self._data:
+                self._resolve(key)
+        return
+
+    def _borrow(self, cls=None):
+        """
+        Return composite object (of type ``cls``) sharing the store of
+        this one copy-on-write, in constant time. Both objects detach
+        from the shared store before it would change (see :meth:`_detach`),
+        so nodes are only copied along the paths that are changed, and
+        changes never leak between them. Frozen composite objects are
+        shared as-is, unless they're thawed into mutable ones.
+        """
+        if isinstance(self, frozencomposite):
+            if cls is None or issubclass(cls, frozencomposite):
+                return self
+            state, indexes = _THAWED, None
+        else:
+            state, indexes = _BORROWED, self._indexes if self._kind == _LIST else None
+            _setattr(self, '_lazy', True)
+            if not self._shared:
+                _setattr(self, '_shared', _SHARED)
+        view = object.__new__(cls or type(self))
+        _setattr(view, '_kind', self._kind)
+        _setattr(view, '_data', self._data)
+        _setattr(view, '_lazy', True)
+        _setattr(view, '_shared', state)
+        if self._kind == _LIST:
+            # only indexed fields are used, since indexes are rebuilt on detach
+            _setattr(view, '_indexes', dict(indexes) if indexes else None)
+        return view
+
+    def _detach(self):
+        """
+        Give composite object a store of its own, before changing it or
+        handing out nested children from a store shared copy-on-write
+        (see :meth:`_borrow`). The lender of a store keeps its children,
+        and they're replaced by borrowed copies in the shared store, so
+        references to them stay attached. Borrowers get borrowed copies
+        of the children instead.
         """
-        Load data from string.
+        state, store = self._shared, self._data
+        _setattr(self, '_shared', False)
+        keys = store if self._kind == _DICT else range(len(store))
+        if state == _SHARED:
+            _setattr(self, '_data', dict(store) if self._kind == _DICT else list(store))
+            for key in keys:
+                value = store[key]
+                if isinstance(value, composite) and not isinstance(value, frozencomposite):
+                    store[key] = value._borrow()
+            return
 
-        Args:
-            string (str): String to load from.
+        cls, thaw = type(self), state == _THAWED
+        copy = {} if self._kind == _DICT else [None] * len(store)
+        for key in keys:
+            value = store[key]
+            if isinstance(value, composite) and (thaw or not isinstance(value, frozencomposite)):
+                value = value._borrow(cls)
+            copy[key] = value
+        _setattr(self, '_data', copy)
+
+        # rebuild borrowed indexes for the copies
+        if self._kind == _LIST and self._indexes:
+            fields = list(self._indexes)
+            _setattr(self, '_indexes', None)
+            for field in fields:
+                self.create_index(field)
+        return
 
-        Examlple:
-            >>> with open('data.json', 'r') as json:
-            >>>     jdat = json.read()
-            >>> data = composite.from_string(jdat)
+    def _derive(self, keep):
         """
-        return cls(eval(string))
+        Return composite object for result of operation on this (and
+        other) composite objects, borrowing their children instead of
+        copying them (see :meth:`_borrow`).
+        """
+        if isinstance(keep, dict):
+            keep = {key: value._borrow() if isinstance(value, composite) else value for key, value in keep.items()}
+        else:
+            keep = [value._borrow() if isinstance(value, composite) else value for value in keep]
+        return composite(keep, lazy=True)
 
     def __len__(self):
-        return max(len(self._list), len(self._dict))
+        return len(self._data)
 
     def __str__(self):
         return str(self.json())
@@ -158,52 +2075,64 @@ class composite(object):
         return str(self)
 
     def __iter__(self):
-        if self.meta_type == 'list':
-            for entry in self._list:
-                yield entry
-
-        elif self.meta_type == 'dict':
-            for entry in self._dict:
-                yield entry
+        if self._kind == _LIST:
+            self._expand()
+        for entry in self._data:
+            yield entry
         return
 
     def __getattr__(self, name):
-        if name in self._dict:
-            return self._dict[name]
-        else:
+        # only called after normal lookup fails, so data keys never
+        # shadow methods (internal attributes are only missing before
+        # initialization, and would otherwise recurse)
+        if name in _INTERNAL or self._kind != _DICT or name not in self._data:
             raise AttributeError('\'composite\' object has no attribute {}'.format(name))
-        return
+        if self._lazy:
+            return self._resolve(name)
+        return self._data[name]
 
     def __getitem__(self, item):
-        if self.meta_type == 'list':
-            return self._list[item]
-        elif self.meta_type == 'dict':
-            return self._dict[item]
-        else:
-            raise KeyError(str(item))
-        return
+        if self._lazy:
+            if isinstance(item, slice):
+                self._expand()
+                return self._data[item]
+            return self._resolve(item)
+        return self._data[item]
 
     def __delitem__(self, item):
-        if self.meta_type == 'list':
-            del self._list[item]
-        elif self.meta_type == 'dict':
-            del self._dict[item]
-        else:
-            raise KeyError(str(item))
+        if self._shared:
+            self._detach()
+        if self._kind == _LIST and self._indexes:
+            old = self._data[item]
+            for entry in (old if isinstance(item, slice) else [old]):
+                self._unindex(entry)
+        del self._data[item]
         return
 
     def __setattr__(self, name, value):
-        if name == '_list' or name == '_dict' or name == 'meta_type':
-            super(composite, self).__setattr__(name, value)
+        if name in _INTERNAL:
+            _setattr(self, name, value)
+        elif self._kind == _DICT:
+            if self._shared:
+                self._detach()
+            self._data[name] = value
         else:
-            self._dict[name] = value
+            raise AssertionError('Cannot set attribute on object of `list` base type!')
         return
 
     def __setitem__(self, idx, value):
-        if self.meta_type == 'list':
-            self._list[idx] = value
-        elif self.meta_type == 'dict':
-            self._dict[idx] = value
+        if self._shared:
+            self._detach()
+        if self._kind == _LIST and self._indexes:
+            if isinstance(idx, slice):
+                self._data[idx] = value
+                self._reindex()
+                return
+            self._unindex(self._data[idx])
+            self._data[idx] = value
+            self._index(idx)
+            return
+        self._data[idx] = value
         return
 
     def __add__(self, other):
@@ -212,49 +2141,53 @@ class composite(object):
         #       Get feedback about this, and see if it intuitively makes
         #       sense. Since we have set-based operators now, it makes
         #       sense.
-        if self.meta_type == 'list':
+        self._expand()
+        if self._kind == _LIST:
             if isinstance(other, (composite, dict, list, tuple)):
-                other = composite(other)
+                if not isinstance(other, composite):
+                    other = composite(other)
+                other._expand()
                 if len(self) == 0:
                     return other
                 elif len(other) == 0:
                     return self
-                elif other.meta_type == 'list':
-                    return composite(self._list + other._list)
-                elif other.meta_type == 'dict':
-                    return composite([self._list, other._dict])
+                elif other._kind == _LIST:
+                    return self._derive(self._data + other._data)
+                elif other._kind == _DICT:
+                    return self._derive([self, other])
             else:
-                return composite(self._list + [other])
-        elif self.meta_type == 'dict':
+                return self._derive(self._data + [other])
+        elif self._kind == _DICT:
             if isinstance(other, (composite, dict, list, tuple)):
-                other = composite(other)
+                if not isinstance(other, composite):
+                    other = composite(other)
+                other._expand()
                 if len(self) == 0:
                     return other
                 elif len(other) == 0:
                     return self
-                elif other.meta_type == 'list':
-                    return composite([self._dict, other._list])
-                elif other.meta_type == 'dict':
+                elif other._kind == _LIST:
+                    return self._derive([self, other])
+                elif other._kind == _DICT:
                     return self.union(other, recursive=True, overwrite=True)
             else:
-                return composite([self._dict, other])
+                return self._derive([self, other])
         return
 
     def __contains__(self, item):
-        if self.meta_type == 'list':
-            return item in self._list
-        elif self.meta_type == 'dict':
-            return item in self._dict
+        return item in self._data
 
     def __eq__(self, other):
-        if isinstance(other, composite):
-            return self.json() == other.json()
-        else:
-            return self.json() == other
+        return _equal(self, other)
 
     def __ne__(self, other):
         return not (self == other)
 
+    def __reduce__(self):
+        # pickle (and copy) as plain data, which is encoded by pickle's C
+        # implementation, instead of the internal state of every node
+        return (type(self), (self.json(), self._lazy))
+
     def intersection(self, other, recursive=True):
         """
         Recursively compute intersection of data. For dictionaries, items
@@ -269,31 +2202,31 @@ class composite(object):
         """
         if not isinstance(other, composite):
             raise AssertionError('Cannot intersect composite and {} types'.format(type(other)))
+        self._expand()
+        other._expand()
 
-        if self.meta_type != other.meta_type:
+        if self._kind != other._kind:
             return composite({})
 
-        if self.meta_type == 'list':
+        if self._kind == _LIST:
+            index = _hashindex(other._data)
             keep = []
-            for item in self._list:
-                if item in other._list:
-                    if recursive and isinstance(item, composite):
-                        keep.extend(item.intersection(other.index(item), recursive=True))
-                    else:
-                        keep.append(item)
-            return composite(keep)
-        elif self.meta_type == 'dict':
+            for item in self._data:
+                if item in index:
+                    keep.append(item)
+            return self._derive(keep)
+        elif self._kind == _DICT:
             keep = {}
-            for key in self._dict:
-                item = self._dict[key]
-                if key in other._dict:
+            for key in self._data:
+                item = self._data[key]
+                if key in other._data:
                     if recursive and \
                        isinstance(item, composite) and \
-                       isinstance(other.get(key), composite):
-                        keep[key] = item.intersection(other.get(key), recursive=True)
-                    elif item == other[key]:
+                       isinstance(other._data[key], composite):
+                        keep[key] = item.intersection(other._data[key], recursive=True)
+                    elif item == other._data[key]:
                         keep[key] = item
-            return composite(keep)
+            return self._derive(keep)
         return
 
     def difference(self, other, recursive=True):
@@ -310,35 +2243,57 @@ class composite(object):
         """
         if not isinstance(other, composite):
             raise AssertionError('Cannot difference composite and {} types'.format(type(other)))
+        self._expand()
+        other._expand()
 
-        if self.meta_type != other.meta_type:
+        if self._kind != other._kind:
             return self
 
-        if self.meta_type == 'list':
+        if self._kind == _LIST:
+            index = _hashindex(other._data)
             keep = []
-            for item in self._list:
-                if item not in other._list:
-                    if recursive and isinstance(item, composite):
-                        keep.extend(item.difference(other.index(item), recursive=True))
-                    else:
-                        keep.append(item)
-            return composite(keep)
-        elif self.meta_type == 'dict':
+            for item in self._data:
+                if item not in index:
+                    keep.append(item)
+            return self._derive(keep)
+        elif self._kind == _DICT:
             keep = {}
-            for key in self._dict:
-                item = self._dict[key]
-                if key in other._dict:
+            for key in self._data:
+                item = self._data[key]
+                if key in other._data:
                     if recursive and \
                        isinstance(item, composite) and \
-                       isinstance(other.get(key), composite):
-                        keep[key] = item.difference(other.get(key), recursive=True)
-                    elif item != other[key]:
+                       isinstance(other._data[key], composite):
+                        keep[key] = item.difference(other._data[key], recursive=True)
+                    elif item != other._data[key]:
                         keep[key] = item
                 else:
                     keep[key] = item
-            return composite(keep)
+            return self._derive(keep)
         return
 
+    def diff(self, other):
+        """
+        Return list of operations (in JSON Patch format, RFC 6902) that
+        change this object into other, computed in a single walk over
+        both objects. Applying the operations with :meth:`patch`
+        reproduces other, so changes can be shared instead of whole
+        documents.
+
+        Args:
+            other (composite, dict, list): Object to compute changes to.
+
+        Examlple:
+            >>> data = composite({'one': 1, 'two': [1, 2]})
+            >>> data.diff({'two': [1, 2, 3], 'four': 4})
+            [{'op': 'remove', 'path': '/one'},
+             {'op': 'add', 'path': '/two/2', 'value': 3},
+             {'op': 'add', 'path': '/four', 'value': 4}]
+        """
+        ops = []
+        _diff(self, other, '', ops)
+        return ops
+
     def union(self, other, recursive=True, overwrite=False):
         """
         Recursively compute union of data. For dictionaries, items
@@ -356,23 +2311,24 @@ class composite(object):
         """
         if not isinstance(other, composite):
             raise AssertionError('Cannot union composite and {} types'.format(type(other)))
+        self._expand()
+        other._expand()
 
-        if self.meta_type != other.meta_type:
-            return composite([self, other])
+        if self._kind != other._kind:
+            return self._derive([self, other])
 
-        if self.meta_type == 'list':
-            keep = []
-            for item in self._list:
-                keep.append(item)
-            for item in other._list:
-                if item not in self._list:
+        if self._kind == _LIST:
+            index = _hashindex(self._data)
+            keep = list(self._data)
+            for item in other._data:
+                if item not in index:
                     keep.append(item)
-            return composite(keep)
-        elif self.meta_type == 'dict':
+            return self._derive(keep)
+        elif self._kind == _DICT:
             keep = {}
-            for key in list(set(list(self._dict.keys()) + list(other._dict.keys()))):
-                left = self._dict.get(key)
-                right = other._dict.get(key)
+            for key in list(set(list(self._data.keys()) + list(other._data.keys()))):
+                left = self._data.get(key)
+                right = other._data.get(key)
                 if recursive and \
                    isinstance(left, composite) and \
                    isinstance(right, composite):
@@ -386,28 +2342,364 @@ class composite(object):
                 elif overwrite:
                     keep[key] = right
                 else:
-                    keep[key] = composite([left, right])
-            return composite(keep)
+                    keep[key] = self._derive([left, right])
+            return self._derive(keep)
         return
 
     def index(self, item):
         """
         Return index containing value.
         """
-        return self._list.index(item)
+        return self._data.index(item)
+
+    def _index(self, idx):
+        """
+        Add item at position to secondary indexes.
+        """
+        # lazy items are wrapped first, so indexed entries stay identical
+        # to the objects in the internal store
+        item = self._resolve(idx)
+        for accessor, index in self._indexes.values():
+            try:
+                index.add(accessor.get(item), item)
+            except KeyError:
+                pass
+        return
+
+    def _unindex(self, item):
+        """
+        Remove item from secondary indexes.
+        """
+        for accessor, index in self._indexes.values():
+            try:
+                index.discard(accessor.get(item), item)
+            except KeyError:
+                pass
+        return
+
+    def _reindex(self):
+        """
+        Rebuild secondary indexes from scratch.
+        """
+        for field in list(self._indexes):
+            self.create_index(field)
+        return
+
+    def create_index(self, field):
+        """
+        Create hash index on field of items in list, for constant-time
+        lookup of items by value (see :meth:`lookup`). The index is kept
+        up to date as items are appended, extended, set or deleted.
+
+        .. NOTE:: Items changed in place aren't moved in the index, so
+            call ``create_index`` again after changing indexed fields
+            of existing items.
+
+        Args:
+            field (str, list): Field (or path, i.e. ``'dimensions.width'``)
+                of items to index.
+
+        Examlple:
+            >>> data = composite([{'id': 1, 'name': 'one'}, {'id': 2, 'name': 'two'}])
+            >>> data.create_index('id')
+            >>> data.lookup('id', 2)
+            [{'id': 2, 'name': 'two'}]
+        """
+        if self._kind != _LIST:
+            raise AssertionError('Cannot index object of `dict` base type!')
+        accessor, index = _accessor(field), _hashindex()
+        for idx in range(len(self._data)):
+            item = self._resolve(idx)
+            try:
+                index.add(accessor.get(item), item)
+            except KeyError:
+                pass
+        if self._indexes is None:
+            self._indexes = {}
+        self._indexes[field] = (accessor, index)
+        return
+
+    def lookup(self, field, value):
+        """
+        Return list of items where indexed field matches value.
+
+        Args:
+            field (str, list): Indexed field (see :meth:`create_index`).
+            value (object): Value to look up.
+
+        Examlple:
+            >>> data.lookup('id', 2)
+            [{'id': 2, 'name': 'two'}]
+        """
+        if self._kind != _LIST:
+            raise AssertionError('Cannot lookup items in object of `dict` base type!')
+        if not self._indexes or field not in self._indexes:
+            raise AssertionError('Cannot lookup `{}` without index (see create_index)!'.format(field))
+        if self._shared:
+            self._detach()
+        accessor, index = self._indexes[field]
+
+        # skip items changed in place since they were indexed
+        matches = []
+        for item in index.get(value):
+            try:
+                if not _equal(accessor.get(item), value):
+                    continue
+            except KeyError:
+                continue
+            matches.append(item)
+        return matches
+
+    def to_columns(self, fields=None, backend='numpy'):
+        """
+        Convert list of records (dictionaries) to dictionary of column
+        arrays in a single pass, so that aggregations can be vectorized.
+        Column types are inferred from values: booleans, integers and
+        floats are stored in typed arrays, and other values (including
+        None) in object arrays. Columns of fields missing from some records
+        are numpy masked arrays (or arrow arrays with nulls), so that
+        :meth:`from_columns` leaves them out again.
+
+        Args:
+            fields (list): Fields (or paths, i.e. ``'dimensions.width'``)
+                to convert. By default, all top-level fields of records
+                are converted.
+            backend (str): Array library to use (``'numpy'`` or ``'arrow'``).
+
+        Examlple:
+            >>> data = composite([{'id': 1, 'price': 2.5}, {'id': 2, 'price': 4.0}])
+            >>> columns = data.to_columns()
+            >>> columns['price'].sum()
+            6.5
+        """
+        if self._kind != _LIST:
+            raise AssertionError('Cannot convert object of `dict` base type to columns!')
+        if backend not in ('numpy', 'arrow'):
+            raise AssertionError('Unsupported backend for columns: {}'.format(backend))
+
+        columns = {}
+        if fields is not None:
+            for field in fields:
+                accessor = _accessor(field)
+                column = columns[field] = []
+                for record in self._data:
+                    try:
+                        column.append(accessor.get(record))
+                    except KeyError:
+                        column.append(_missing)
+        else:
+            for idx, record in enumerate(self._data):
+                if isinstance(record, composite):
+                    record = record._data
+                if not isinstance(record, dict):
+                    raise AssertionError('Cannot convert {} item to columns!'.format(type(record)))
+                for key in record:
+                    column = columns.get(key)
+                    if column is None:
+                        column = columns[key] = [_missing] * idx
+                    column.append(record[key])
+
+                # fill in fields missing from record
+                if len(record) < len(columns):
+                    for column in columns.values():
+                        if len(column) == idx:
+                            column.append(_missing)
+
+        if backend == 'arrow':
+            try:
+                import pyarrow
+            except ImportError:
+                raise AssertionError('Cannot convert columns without pyarrow installed!')
+            return {
+                key: pyarrow.array([None if value is _missing else _plain(value) for value in values])
+                for key, values in columns.items()
+            }
+        return {key: _numpy_column(values, self._wrap) for key, values in columns.items()}
+
+    def _apply(self, runner, func, batch_size, executor, workers):
+        """
+        Run function over items of list in batches, optionally with
+        executor, and return flat list of results.
+        """
+        if self._kind != _LIST:
+            raise AssertionError('Cannot map or filter object of `dict` base type!')
+        self._expand()
+        if executor is None:
+            return runner(func, self._data)
+
+        if batch_size is None:
+            import multiprocessing
+            batch_size = max(1, len(self._data) // (4 * (workers or multiprocessing.cpu_count())))
+        batches = _batches(self._data, batch_size)
+        executor, owned = _executor(executor, workers)
+        try:
+            results = []
+            for batch in executor.map(runner, [func] * len(batches), batches):
+                results.extend(batch)
+            return results
+        finally:
+            if owned:
+                executor.shutdown()
+
+    def map(self, func, batch_size=None, executor=None, workers=None):
+        """
+        Return new list with function applied to each item. Items that
+        the function returns unchanged are shared with this object
+        (and copied on write) instead of being wrapped again.
+
+        Args:
+            func (callable): Function to apply to items. Functions should
+                return new values instead of changing items in place.
+            batch_size (int): Number of items sent to each task when
+                using an executor. By default, items are split into four
+                batches per worker.
+            executor (str, Executor): Run batches in a ``'thread'`` or
+                ``'process'`` pool (or existing ``concurrent.futures``
+                executor). Functions run in process pools must be
+                picklable (i.e. defined at module level).
+            workers (int): Number of workers for pools created by name.
+
+        Examlple:
+            >>> data = composite([{'id': 1, 'price': 2.5}, {'id': 2, 'price': 4.0}])
+            >>> data.map(lambda item: item.price * 2)
+            [5.0, 8.0]
+            >>> data.map(transform, executor='process', workers=8)
+        """
+        return self._derive(self._apply(_map_batch, func, batch_size, executor, workers))
+
+    def filter(self, func, batch_size=None, executor=None, workers=None):
+        """
+        Return new list with items for which function returns True. Items
+        are shared with this object (and copied on write).
+
+        Args:
+            func (callable): Predicate to apply to items.
+            batch_size (int): Number of items sent to each task when
+                using an executor (see :meth:`map`).
+            executor (str, Executor): Run batches in a ``'thread'`` or
+                ``'process'`` pool (or existing ``concurrent.futures``
+                executor).
+            workers (int): Number of workers for pools created by name.
+
+        Examlple:
+            >>> data.filter(lambda item: item.price > 3)
+            [{'id': 2, 'price': 4.0}]
+        """
+        flags = self._apply(_filter_batch, func, batch_size, executor, workers)
+        return self._derive([item for item, keep in zip(self._data, flags) if keep])
 
     def get(self, *args, **kwargs):
         """
         Return item or None, depending on if item exists. This is
         meant to be similar to dict.get() for safe access of a property.
         """
-        return self._dict.get(*args, **kwargs)
+        if self._kind == _LIST:
+            return self._dict.get(*args, **kwargs)
+        if args and args[0] in self._data:
+            return self._resolve(args[0])
+        return self._data.get(*args, **kwargs)
+
+    def get_path(self, path, default=_missing):
+        """
+        Return value at nested path in object. Path strings are parsed
+        once and cached (see :meth:`compile_path`).
+
+        Args:
+            path (str, list): Path string (i.e. ``'four.five[1]'``) or list
+                of keys. Dot-separated components made of digits also
+                index into lists (i.e. ``'four.five.1'``).
+            default (object): Value to return if the path doesn't exist.
+                Without a default, missing paths raise a ``KeyError``.
+
+        Examlple:
+            >>> data = composite({'four': {'five': [6, 7, 8]}})
+            >>> data.get_path('four.five[1]')
+            7
+        """
+        return _accessor(path).get(self, default)
+
+    def set_path(self, path, value):
+        """
+        Set value at nested path in object. All but the last key in the
+        path must already exist.
+
+        Args:
+            path (str, list): Path string (i.e. ``'four.five[1]'``) or list of keys.
+            value (object): Value to set.
+
+        Examlple:
+            >>> data = composite({'four': {'five': [6, 7, 8]}})
+            >>> data.set_path('four.five[1]', 2)
+            >>> data.four.five
+            [6, 2, 8]
+        """
+        _accessor(path).set(self, value)
+        return
+
+    @staticmethod
+    def compile_path(path):
+        """
+        Compile path into reusable accessor, which can be called to get
+        the value at the path in many composite objects with the same
+        structure. Accessors also have ``get``, ``set`` and ``map``
+        (get the value for each item in a list) methods.
+
+        Args:
+            path (str, list): Path string (i.e. ``'four.five[1]'``) or list of keys.
+
+        Examlple:
+            >>> getter = composite.compile_path('dimensions.width')
+            >>> getter(records[0])
+            12
+            >>> getter.map(records)
+            [12, 4, 8, ...]
+            >>> getter.set(records[0], 10)
+        """
+        return _accessor(path)
+
+    def select(self, query):
+        """
+        Lazily iterate over values in object matching query. Queries
+        are paths (see :meth:`get_path`) that can also contain:
+
+            * ``*`` or ``[*]`` - All items of list or values of dictionary.
+            * ``..`` - Recursive descent (the rest of the query is matched
+              at any depth).
+            * ``[?field]`` - Items with the specified field (which can be
+              a path).
+            * ``[?field op value]`` - Items where the field compares to
+              value, with operators ``==``, ``!=``, ``<``, ``<=``, ``>``
+              or ``>=``. Values are JSON literals or single-quoted strings.
+
+        Values are yielded as they're found, without building intermediate
+        lists, so iteration can stop at the first match.
+
+        Args:
+            query (str): Query string.
+
+        Examlple:
+            >>> data = composite({'items': [
+            >>>     {'id': 1, 'tags': [{'name': 'x'}]},
+            >>>     {'id': 2, 'tags': [{'name': 'y'}]},
+            >>> ]})
+            >>> list(data.select('items[?id > 1].id'))
+            [2]
+            >>> next(data.select('items[*].tags[?name=="x"]'))
+            {'name': 'x'}
+            >>> list(data.select('..name'))
+            ['x', 'y']
+        """
+        return _select(self, _parse_query(query))
 
     def pop(self, *args, **kwargs):
         """
         Return item or None, depending on if item exists. This is
         meant to be similar to dict.pop() for safe access of a property.
         """
+        if self._shared:
+            self._detach()
+        if self._lazy and args and args[0] in self._dict:
+            self._resolve(args[0])
         return self._dict.pop(*args, **kwargs)
 
     def update(self, other):
@@ -415,111 +2707,544 @@ class composite(object):
         Update internal dictionary object. This is meant to be an
         analog for dict.update().
         """
-        if self.meta_type == 'list':
+        if self._kind == _LIST:
             raise AssertionError('Cannot update object of `list` base type!')
-        elif self.meta_type == 'dict':
-            self._dict = dict(self + composite(other))
+        elif self._kind == _DICT:
+            if isinstance(other, composite):
+                other = other.json()
+            if not isinstance(other, dict):
+                raise AssertionError('Cannot update object of `dict` base type with {}!'.format(type(other)))
+            self._merge(other)
             return
 
+    def _merge(self, other):
+        """
+        Recursively merge dictionary into object in place, with the
+        same semantics as ``self + other``. Only keys in ``other`` are
+        visited, so the cost is proportional to the size of the patch
+        rather than the size of the object.
+        """
+        if self._shared:
+            self._detach()
+        for key, right in other.items():
+            if key not in self._data:
+                self._data[key] = self._copy(right)
+                continue
+            left = self._resolve(key) if self._lazy else self._data[key]
+            if isinstance(left, composite) and isinstance(right, self._nested):
+                if isinstance(left, frozencomposite):
+                    self._data[key] = left.union(composite(right), overwrite=True)
+                elif left._kind == _DICT and isinstance(right, dict):
+                    left._merge(right)
+                elif left._kind == _LIST and isinstance(right, (list, tuple)):
+                    if len(right) <= _MERGE_SCAN:
+                        missing = [item for item in right if not left._has(item)]
+                    else:
+                        index = _hashindex(left._data)
+                        missing = [item for item in right if item not in index]
+                    left.extend([self._copy(item) for item in missing])
+                else:
+                    self._data[key] = composite([left, self._copy(right)])
+            elif right is not None and not _equal(left, right):
+                self._data[key] = self._copy(right)
+        return
+
+    def _has(self, value):
+        """
+        Check if list contains value, without hashing every item. Values
+        are looked up in a secondary index that covers them if there is
+        one, and otherwise items are compared on one scalar field of the
+        value before being compared in full.
+        """
+        raw = value._data if isinstance(value, composite) else value
+        if not isinstance(raw, dict):
+            return any(_equal(item, value) for item in self._data)
+        for accessor, index in (self._indexes or {}).values():
+            try:
+                key = accessor.get(raw)
+            except KeyError:
+                continue
+            return any(_equal(item, value) for item in index.get(key))
+
+        field = next((key for key in raw if not isinstance(raw[key], (composite, dict, list, tuple))), _missing)
+        if field is _missing:
+            return any(_equal(item, value) for item in self._data)
+        expected = raw[field]
+        for item in self._data:
+            store = item._data if isinstance(item, composite) else item
+            if isinstance(store, dict) and store.get(field, _missing) == expected and _equal(item, value):
+                return True
+        return False
+
+    def patch(self, ops):
+        """
+        Apply list of operations (in JSON Patch format, RFC 6902) to
+        object in place. Supported operations are ``add``, ``remove``
+        and ``replace``, which are the ones generated by :meth:`diff`.
+
+        Args:
+            ops (list): List of operations to apply, in order.
+
+        Examlple:
+            >>> data = composite({'one': 1, 'two': [1, 2]})
+            >>> data.patch([
+            >>>     {'op': 'replace', 'path': '/one', 'value': 2},
+            >>>     {'op': 'add', 'path': '/two/-', 'value': 3},
+            >>> ])
+            >>> print data
+            {'one': 2, 'two': [1, 2, 3]}
+        """
+        for op in ops:
+            name, keys = op['op'], _parse_pointer(op['path'])
+            if name not in ('add', 'remove', 'replace'):
+                raise AssertionError('Cannot apply `{}` operation in patch!'.format(name))
+            value = self._copy(op['value']) if name != 'remove' else None
+
+            # replace whole object
+            if not keys:
+                if name != 'replace' or not isinstance(value, composite):
+                    raise AssertionError('Cannot {} root of composite object with patch!'.format(name))
+                self._kind, self._data, self._lazy, self._indexes = value._kind, value._data, False, None
+                self._shared = False
+                continue
+
+            # walk through items, so that shared subtrees are copied
+            parent = self
+            for key in keys[:-1]:
+                if parent._kind == _LIST:
+                    idx = int(key)
+                    if not 0 <= idx < len(parent):
+                        raise IndexError(op['path'])
+                    parent = parent[idx]
+                else:
+                    parent = parent[_pointer_key(parent._data, key)]
+            key = keys[-1]
+            if parent._kind == _LIST:
+                idx = len(parent) if key == '-' else int(key)
+                if not 0 <= idx <= len(parent) or (name != 'add' and idx == len(parent)):
+                    raise IndexError(op['path'])
+                if name == 'add':
+                    parent[idx:idx] = [value]
+                elif name == 'remove':
+                    del parent[idx]
+                else:
+                    parent[idx] = value
+            else:
+                key = _pointer_key(parent._data, key)
+                if name != 'add' and key not in parent._data:
+                    raise KeyError(op['path'])
+                if name == 'remove':
+                    del parent[key]
+                else:
+                    parent[key] = value
+        return
+
+    def _copy(self, value):
+        """
+        Return copy of value for storing in object, so that it isn't
+        shared with the caller.
+        """
+        if isinstance(value, composite):
+            value = value.json()
+        return self._wrap(value) if isinstance(value, self._nested) else value
+
     def keys(self):
         """
         Return keys for object, if they are available.
         """
-        if self.meta_type == 'list':
+        if self._kind == _LIST:
             return None
-        elif self.meta_type == 'dict':
-            return self._dict.keys()
+        elif self._kind == _DICT:
+            return self._data.keys()
 
     def items(self):
         """
         Return keys for object, if they are available.
         """
-        if self.meta_type == 'list':
-            return self._list
-        elif self.meta_type == 'dict':
-            return self._dict.items()
+        self._expand()
+        if self._kind == _LIST:
+            return self._data
+        elif self._kind == _DICT:
+            return self._data.items()
 
     def values(self):
         """
         Return keys for object, if they are available.
         """
-        if self.meta_type == 'list':
-            return self._list
-        elif self.meta_type == 'dict':
-            return self._dict.values()
+        self._expand()
+        if self._kind == _LIST:
+            return self._data
+        elif self._kind == _DICT:
+            return self._data.values()
 
     def append(self, item):
         """
         Append to object, if object is list.
         """
-        if self.meta_type == 'dict':
+        if self._kind == _DICT:
             raise AssertionError('Cannot append to object of `dict` base type!')
-        if self.meta_type == 'list':
-            self._list.append(item)
+        if self._kind == _LIST:
+            if self._shared:
+                self._detach()
+            self._data.append(item)
+            if self._indexes:
+                self._index(len(self._data) - 1)
         return
 
     def extend(self, item):
         """
         Extend list from object, if object is list.
         """
-        if self.meta_type == 'dict':
+        if self._kind == _DICT:
             raise AssertionError('Cannot extend to object of `dict` base type!')
-        if self.meta_type == 'list':
-            self._list.extend(item)
+        if self._kind == _LIST:
+            if self._shared:
+                self._detach()
+            start = len(self._data)
+            self._data.extend(item)
+            if self._indexes:
+                for idx in range(start, len(self._data)):
+                    self._index(idx)
         return
 
     def json(self):
         """
         Return JSON representation of object.
         """
-        if self.meta_type == 'list':
-            ret = []
-            for dat in self._list:
-                if not isinstance(dat, composite):
-                    ret.append(dat)
-                else:
-                    ret.append(dat.json())
-            return ret
+        data = self._data
+        if self._kind == _LIST:
+            return [_plain(dat) for dat in data]
 
-        elif self.meta_type == 'dict':
+        elif self._kind == _DICT:
             ret = {}
-            for key in self._dict:
-                if not isinstance(self._dict[key], composite):
-                    ret[key] = self._dict[key]
-                else:
-                    ret[key] = self._dict[key].json()
+            for key in data:
+                ret[key] = _plain(data[key])
             return ret
 
-    def write_json(self, fh, pretty=True):
+    def write_json(self, fh, pretty=True, backend=None):
         """
-        Write composite object to file handle in JSON format.
+        Write composite object to file handle in JSON format. For backends
+        that support it (including the standard library), the tree is
+        encoded in a single pass and written to the file handle in chunks,
+        so memory use is proportional to depth rather than size.
 
         Args:
             fh (file): File handle to write to.
             pretty (bool): Sort keys and indent in output.
+            backend (str): Name of json backend to use.
         """
-        sjson = json.JSONEncoder().encode(self.json())
-        if pretty:
-            json.dump(json.loads(sjson), fh, sort_keys=True, indent=4)
+        loads, dumps, dump = _json_backend(backend)
+        if dump is not None:
+            dump(self, fh, pretty=pretty)
         else:
-            json.dump(json.loads(sjson), fh)
+            fh.write(dumps(self, pretty=pretty))
         return
 
     def write_yaml(self, fh):
         """
-        Write composite object to file handle in YAML format.
+        Write composite object to file handle in YAML format. The
+        C-accelerated libyaml dumper is used when available.
 
         Args:
             fh (file): File handle to write to.
         """
-        yaml.dump(self.json(), fh)
+        yaml.dump(self, fh, Dumper=_yamldumper)
         return
 
-    def write(self, fh, pretty=True):
+    def write(self, fh, pretty=True, backend=None):
         """
         API niceness defaulting to composite.write_json().
         """
-        return self.write_json(fh, pretty=pretty)
+        return self.write_json(fh, pretty=pretty, backend=backend)
+
+    def awrite(self, path, pretty=True, format=None, executor=None):
+        """
+        Write composite object to file without blocking the asyncio event
+        loop. Encoding and writing run in an executor, on a copy-on-write
+        snapshot of the object, so the object (and its children) can be
+        changed while the returned future is pending. References to
+        deeper nested objects taken before the call aren't isolated from
+        the snapshot, and should be taken again after it.
+
+        Args:
+            path (str): Path of file to write.
+            pretty (bool): Sort keys and indent in output (json only).
+            format (str): Format of file (by default, detected from the file
+                extension, or json).
+            executor (Executor): Executor to run in. By default, the default
+                executor of the event loop is used.
+
+        Examlple:
+            >>> await data.awrite('config.json')
+        """
+        snapshot = self if isinstance(self, frozencomposite) else self._derive(self._data)
+        return _run_async(executor, functools.partial(
+            _write_path, snapshot, path, pretty=pretty, format=format
+        ))
+
+    def write_binary(self, fh, format='msgpack'):
+        """
+        Write composite object to file handle in binary format. Nested
+        composite objects are encoded through their internal store,
+        without a full copy of the data.
+
+        Args:
+            fh (file): File handle (opened in binary mode) to write to.
+            format (str): Name of binary format (see :meth:`register_binary_format`).
+
+        Examlple:
+            >>> with open('data.msgpack', 'wb') as fo:
+            >>>     data.write_binary(fo, format='msgpack')
+        """
+        fh.write(_binary_format(format)[1](self))
+        return
+
+    def write_msgpack(self, fh):
+        """
+        Write composite object to file handle in MessagePack format.
+        Requires the ``msgpack`` package.
+
+        Args:
+            fh (file): File handle (opened in binary mode) to write to.
+        """
+        return self.write_binary(fh, format='msgpack')
+
+    def write_cbor(self, fh):
+        """
+        Write composite object to file handle in CBOR format. Requires
+        the ``cbor2`` package.
+
+        Args:
+            fh (file): File handle (opened in binary mode) to write to.
+        """
+        return self.write_binary(fh, format='cbor')
+
+    def save_snapshot(self, path):
+        """
+        Write composite object to binary snapshot file, which can be
+        memory-mapped with :meth:`open_snapshot` instead of parsed.
+
+        Args:
+            path (str): Path to write snapshot to.
+
+        Examlple:
+            >>> data = composite.load(open('catalog.json'))
+            >>> data.save_snapshot('catalog.snap')
+        """
+        with open(path, 'wb') as fh:
+            fh.write(_SNAPSHOT_MAGIC + struct.pack('<Q', 0))
+            root = _snapshotwriter(fh).write(self)
+            fh.seek(len(_SNAPSHOT_MAGIC))
+            fh.write(struct.pack('<Q', root))
+        return
+
+
+class frozencomposite(composite):
+    """
+    Immutable composite object, which can be used as a dictionary key or
+    set member. Hashes are structural (computed from nested content) and
+    cached for each subtree, so hashing a large object only walks it
+    once. Frozen composite objects compare equal to mutable composite
+    objects (and raw data) with the same content.
+
+    Args:
+        data (tuple, list, dict, composite): Data to build composite datastructure
+            from. Mutable composite objects are copied.
+        lazy (bool): Whether or not to defer wrapping nested dictionaries
+            and lists until they are accessed.
+
+    Example:
+        >>> data = frozencomposite({'one': 1, 'two': [1, 2]})
+        >>> lookup = {data: 'value'}
+        >>> lookup[frozencomposite({'two': [1, 2], 'one': 1})]
+        'value'
+        >>> data.one = 2
+        TypeError: 'frozencomposite' object does not support assignment
+    """
+    __slots__ = ('_hash',)
+    _nested = (list, tuple, dict, composite)
+
+    def __init__(self, data, lazy=False):
+        self._hash = None
+        if isinstance(data, composite) and not isinstance(data, frozencomposite):
+            data = data._data
+        super(frozencomposite, self).__init__(data, lazy=lazy)
+        return
+
+    def _wrap(self, value, lazy=False):
+        if isinstance(value, frozencomposite):
+            return value
+        return frozencomposite(value, lazy=lazy)
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('\'frozencomposite\' object does not support assignment')
+
+    def __setattr__(self, name, value):
+        if name not in _INTERNAL:
+            self._immutable()
+        _setattr(self, name, value)
+        return
+
+    def __hash__(self):
+        if self._hash is None:
+            self._hash = _hashof(self._data)
+        return self._hash
+
+    __setitem__ = __delitem__ = _immutable
+    append = extend = update = patch = pop = _immutable
+
+
+_yamldumper.add_multi_representer(composite, _yamldumper.represent_composite)
+_yamldumper.add_representer(tuple, _yamldumper.represent_list)
+
+
+# snapshots
+# ---------
+# snapshot files start with a magic string and the offset of the root node,
+# followed by nodes, which start with a one-byte tag:
+#   ``N``, ``T``, ``F``: None, True, False
+#   ``i``: 64-bit integer, ``n``: larger integer (as decimal string)
+#   ``f``: 64-bit float, ``s``: utf-8 string (with 32-bit length)
+#   ``l``: list (32-bit length, then 64-bit offsets of items)
+#   ``d``: dict (32-bit length, then 64-bit offsets of keys and values)
+# nodes are written after their children, and repeated scalars are
+# only written once.
+_SNAPSHOT_MAGIC = b'GEMSNAP1'
+_SNAPSHOT_HEADER = len(_SNAPSHOT_MAGIC) + 8
+_SNAPSHOT_SCALARS = {b'N': None, b'T': True, b'F': False}
+
+
+class _snapshotwriter(object):
+    """
+    Write nested data to file handle in snapshot format.
+    """
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.offset = _SNAPSHOT_HEADER
+        self.scalars = {}
+        return
+
+    def emit(self, chunk):
+        offset = self.offset
+        self.fh.write(chunk)
+        self.offset += len(chunk)
+        return offset
+
+    def write(self, value):
+        """
+        Write value (and its children), returning offset of its node.
+        """
+        if isinstance(value, composite):
+            value = value._data
+        if isinstance(value, dict):
+            offsets = []
+            for key in value:
+                offsets.append(self.write(key))
+                offsets.append(self.write(value[key]))
+            return self.emit(struct.pack('<cI{}Q'.format(len(offsets)), b'd', len(value), *offsets))
+        elif isinstance(value, (list, tuple)):
+            offsets = [self.write(item) for item in value]
+            return self.emit(struct.pack('<cI{}Q'.format(len(offsets)), b'l', len(offsets), *offsets))
+
+        chunk = self.encode(value)
+        if chunk not in self.scalars:
+            self.scalars[chunk] = self.emit(chunk)
+        return self.scalars[chunk]
+
+    def encode(self, value):
+        if value is None:
+            return b'N'
+        elif value is True or value is False:
+            return b'T' if value else b'F'
+        elif isinstance(value, (int, long)):
+            if -2 ** 63 <= value < 2 ** 63:
+                return struct.pack('<cq', b'i', value)
+            value = str(value).encode('utf-8')
+            return struct.pack('<cI', b'n', len(value)) + value
+        elif isinstance(value, float):
+            return struct.pack('<cd', b'f', value)
+        elif isinstance(value, basestring):
+            if not isinstance(value, bytes):
+                value = value.encode('utf-8')
+            return struct.pack('<cI', b's', len(value)) + value
+        raise AssertionError('Cannot save {} type in snapshot!'.format(type(value)))
+
+
+def _snapshot_value(source, offset):
+    """
+    Decode scalar at offset in snapshot, or return (undecoded)
+    composite object for nested data.
+    """
+    buffer = source[0]
+    tag = buffer[offset:offset + 1]
+    if tag in _SNAPSHOT_SCALARS:
+        return _SNAPSHOT_SCALARS[tag]
+    elif tag == b's':
+        size = struct.unpack_from('<I', buffer, offset + 1)[0]
+        return buffer[offset + 5:offset + 5 + size].decode('utf-8')
+    elif tag == b'i':
+        return struct.unpack_from('<q', buffer, offset + 1)[0]
+    elif tag == b'f':
+        return struct.unpack_from('<d', buffer, offset + 1)[0]
+    elif tag == b'n':
+        size = struct.unpack_from('<I', buffer, offset + 1)[0]
+        return int(buffer[offset + 5:offset + 5 + size].decode('utf-8'))
+    elif tag in (b'l', b'd'):
+        return _snapshot.node(source, offset, _LIST if tag == b'l' else _DICT)
+    raise AssertionError('Cannot decode snapshot node at offset {}!'.format(offset))
+
+
+class _snapshot(frozencomposite):
+    """
+    Read-only composite object backed by memory-mapped snapshot file
+    (see :meth:`composite.open_snapshot`). The store of each node is
+    decoded from the file on first access, so opening a snapshot is
+    constant time, and processes opening the same snapshot share the
+    same pages of memory for everything they haven't accessed.
+    """
+    # source is a tuple of the memory map and a cache of decoded keys,
+    # which is shared by all nodes (keys are repeated across records)
+    __slots__ = ('_source', '_offset', '_store')
+
+    @classmethod
+    def node(cls, source, offset, kind):
+        self = cls.__new__(cls)
+        _setattr(self, '_source', source)
+        _setattr(self, '_offset', offset)
+        _setattr(self, '_store', None)
+        _setattr(self, '_kind', kind)
+        _setattr(self, '_lazy', False)
+        _setattr(self, '_shared', False)
+        _setattr(self, '_indexes', None)
+        _setattr(self, '_hash', None)
+        return self
+
+    @property
+    def _data(self):
+        store = self._store
+        if store is not None:
+            return store
+        source, offset = self._source, self._offset
+        buffer, keys = source
+        size = struct.unpack_from('<I', buffer, offset + 1)[0]
+        if self._kind == _LIST:
+            offsets = struct.unpack_from('<{}Q'.format(size), buffer, offset + 5)
+            store = [_snapshot_value(source, item) for item in offsets]
+        else:
+            offsets = struct.unpack_from('<{}Q'.format(2 * size), buffer, offset + 5)
+            store = {}
+            for idx in range(0, 2 * size, 2):
+                key = offsets[idx]
+                if key not in keys:
+                    keys[key] = _snapshot_value(source, key)
+                store[keys[key]] = _snapshot_value(source, offsets[idx + 1])
+        _setattr(self, '_store', store)
+        return store
+
+    def __reduce__(self):
+        # memory maps can't be pickled or copied
+        return (frozencomposite, (self.json(),))
 
 
 # data management
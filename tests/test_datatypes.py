@@ -9,10 +9,15 @@
 
 # imports
 # -------
+import io
 import os
+import json
 import uuid
+import pickle
 import unittest
-from gems import composite, filetree
+import yaml
+from importlib import import_module
+from gems import composite, frozencomposite, filetree
 
 
 # config
@@ -71,6 +76,245 @@ class TestComposite(unittest.TestCase):
         self.assertEqual(len(data), 3)
         return
 
+    def test_lazy(self):
+        data = composite(self._dict, lazy=True)
+        self.assertTrue(isinstance(data._dict['four'], dict))
+        self.assertEqual(data.four.five[1], 7)
+        self.assertTrue(isinstance(data._dict['four'], composite))
+        self.assertTrue(data.four is data.four)
+        self.assertTrue(isinstance(data._dict['three'], list))
+        self.assertEqual(data['three'][2].three, 'four')
+        self.assertEqual(data, self._dict)
+        self.assertEqual(data.json(), self._dict)
+        self.assertEqual(data, composite(self._dict))
+
+        # raw input isn't modified by caching wrappers
+        self.assertTrue(isinstance(self._dict['four'], dict))
+        data.four.nine = 11
+        self.assertEqual(self._dict['four']['nine'], 10)
+
+        # set operations
+        lazy = composite(self._c1.json(), lazy=True)
+        result = composite({
+            'one': 1,
+            'two': [1, 2],
+            'three': {'four': 5},
+        })
+        self.assertEqual(lazy.intersection(composite(self._c2.json(), lazy=True)), result)
+        self.assertEqual(lazy.union(self._c2), self._c1.union(self._c2))
+
+        data = composite(self._list, lazy=True)
+        self.assertEqual(data[1].six[3], 'ten')
+        self.assertEqual(data[2][2].seventeen[0], 18)
+        self.assertTrue(all(isinstance(item, composite) for item in data[1:]))
+        self.assertEqual(data, self._list)
+
+        with open(os.path.join(__resources__, 'dict.yml'), 'r') as fi:
+            data = composite.load(fi, lazy=True)
+        self.assertEqual(data.four.five[1], 7)
+        return
+
+    def test_iterload(self):
+        with open(os.path.join(__resources__, 'list.json'), 'r') as fi:
+            items = list(composite.iterload(fi, chunk_size=8))
+        self.assertEqual(items, self._list)
+        self.assertEqual(items[1].six[3], 'ten')
+        with open(os.path.join(__resources__, 'list.yml'), 'r') as fi:
+            self.assertEqual(list(composite.iterload(fi, format='yaml')), self._list)
+
+        with open(os.path.join(__resources__, 'dict.json'), 'r') as fi:
+            entries = dict(composite.iterload(fi, path='four', chunk_size=8))
+        self.assertEqual(entries, self._dict['four'])
+        with open(os.path.join(__resources__, 'dict.json'), 'r') as fi:
+            self.assertEqual(list(composite.iterload(fi, path='three.2', chunk_size=8)), [('three', 'four')])
+        with open(os.path.join(__resources__, 'dict.yml'), 'r') as fi:
+            self.assertEqual(list(composite.iterload(fi, path='four.five', format='yaml')), [6, 7, 8])
+
+        # binary streams, with chunks ending inside multi-byte characters
+        content = json.dumps([u'\xe9\xe9', 1, {u'\u2603': [u'\U0001f600']}], ensure_ascii=False).encode('utf-8')
+        for size in [1, 2, 3, 8]:
+            items = list(composite.iterload(io.BytesIO(content), format='json', chunk_size=size))
+            self.assertEqual(items, [u'\xe9\xe9', 1, {u'\u2603': [u'\U0001f600']}])
+
+        with open(os.path.join(__resources__, 'dict.json'), 'r') as fi:
+            with self.assertRaises(KeyError):
+                list(composite.iterload(fi, path='notakey'))
+        return
+
+    def test_load_many(self):
+        paths = [os.path.join(__resources__, name) for name in ['dict.json', 'dict.yml', 'list.json', 'list.yml']]
+        for executor in [None, 'thread', 'process']:
+            data = composite.load_many(paths, executor=executor, workers=2)
+            self.assertEqual(list(data), paths)
+            self.assertEqual(data[paths[0]], self._dict)
+            self.assertEqual(data[paths[1]], self._dict)
+            self.assertEqual(data[paths[3]], self._list)
+        self.assertTrue(composite.load_many(paths[:1], lazy=True)[paths[0]]._lazy)
+
+        # merged in order, like a left fold
+        layers = [{'one': idx, 'two': {'three': [idx], 'layer{}'.format(idx): True}} for idx in range(5)]
+        names = []
+        for layer in layers:
+            names.append('.datatypes-test-' + str(uuid.uuid1()) + '.json')
+            with open(names[-1], 'w') as fo:
+                json.dump(layer, fo)
+        try:
+            merged = composite.load_many(names, executor='thread', merge=True)
+            expected = composite(layers[0])
+            for layer in layers[1:]:
+                expected = expected.union(composite(layer), overwrite=True)
+            self.assertEqual(merged, expected)
+            self.assertEqual(merged.one, 4)
+            self.assertEqual(merged.two.three, [0, 1, 2, 3, 4])
+
+            # combined values nest in file order without overwrite
+            merged = composite.load_many(names, executor=None, merge=True, overwrite=False)
+            expected = composite(layers[0])
+            for layer in layers[1:]:
+                expected = expected.union(composite(layer), overwrite=False)
+            self.assertEqual(merged, expected)
+            self.assertEqual(merged.one, [[[[0, 1], 2], 3], 4])
+
+            # values changing type between files
+            for name, layer in zip(names, [{'a': [1]}, {'a': {'k': 1}}, {'a': [2]}, {'a': {'k': 2}}]):
+                with open(name, 'w') as fo:
+                    json.dump(layer, fo)
+            merged = composite.load_many(names[:4], executor=None, merge=True)
+            self.assertEqual(merged, {'a': [[[1], {'k': 1}, 2], {'k': 2}]})
+
+            # merged objects have the requested type
+            merged = frozencomposite.load_many(names, executor=None, merge=True)
+            self.assertTrue(isinstance(merged, frozencomposite))
+            self.assertTrue(isinstance(merged.a, frozencomposite))
+            self.assertFalse(merged._lazy)
+            self.assertTrue(composite.load_many(names, executor=None, merge=True, lazy=True)._lazy)
+        finally:
+            for name in names:
+                os.remove(name)
+        self.assertEqual(composite.load_many([], merge=True), {})
+        return
+
+    def test_load_cache(self):
+        import shutil
+        import tempfile
+        cache = tempfile.mkdtemp()
+        fname = os.path.join(cache, 'data.yml')
+        with open(fname, 'w') as fo:
+            yaml.dump(self._dict, fo)
+        try:
+            directory = os.path.join(cache, 'entries')
+            with open(fname, 'r') as fi:
+                data = composite.load(fi, cache=directory)
+            self.assertEqual(data, self._dict)
+            entries = os.listdir(directory)
+            self.assertEqual(len(entries), 1)
+
+            # cached data are used instead of parsing
+            with open(os.path.join(directory, entries[0]), 'wb') as fo:
+                pickle.dump({'cached': True}, fo)
+            with open(fname, 'r') as fi:
+                self.assertEqual(composite.load(fi, cache=directory), {'cached': True})
+            with open(fname, 'r') as fi:
+                self.assertEqual(composite.load(fi), self._dict)
+            with open(fname, 'r') as fi:
+                frozen = frozencomposite.load(fi, cache=directory, lazy=True)
+            self.assertTrue(isinstance(frozen, frozencomposite))
+
+            # changed files and corrupt entries are parsed again
+            with open(fname, 'w') as fo:
+                yaml.dump(self._list, fo)
+            with open(fname, 'r') as fi:
+                self.assertEqual(composite.load(fi, cache=directory), self._list)
+            for entry in os.listdir(directory):
+                with open(os.path.join(directory, entry), 'wb') as fo:
+                    fo.write(b'corrupt')
+            with open(fname, 'r') as fi:
+                self.assertEqual(composite.load(fi, cache=directory), self._list)
+            self.assertEqual(composite.load_many([fname], cache=directory, executor=None)[fname], self._list)
+
+            # least recently used entries are evicted
+            shutil.rmtree(directory)
+            entries = []
+            for idx in range(5):
+                path = os.path.join(cache, 'data{}.json'.format(idx))
+                with open(path, 'w') as fo:
+                    json.dump(self._dict, fo)
+                before = set(os.listdir(directory)) if os.path.exists(directory) else set()
+                with open(path, 'r') as fi:
+                    composite.load(fi, cache=directory, cache_size=3 * size if idx == 4 else None)
+                entries.append((set(os.listdir(directory)) - before).pop())
+                if idx < 3:
+                    os.utime(os.path.join(directory, entries[-1]), (idx + 1, idx + 1))
+                if idx == 2:
+                    with open(os.path.join(cache, 'data0.json'), 'r') as fi:
+                        composite.load(fi, cache=directory)
+                    size = os.path.getsize(os.path.join(directory, entries[0]))
+            self.assertEqual(set(os.listdir(directory)), set([entries[0], entries[3], entries[4]]))
+            with open(os.path.join(cache, 'data1.json'), 'r') as fi:
+                self.assertEqual(composite.load(fi, cache=directory, cache_size=0), self._dict)
+            self.assertEqual(os.listdir(directory), [])
+
+            # caches that can't be written are skipped
+            for directory in [fname, os.path.join(fname, 'entries')]:
+                with open(fname, 'r') as fi:
+                    self.assertEqual(composite.load(fi, cache=directory), self._list)
+            self.assertFalse([name for name in os.listdir(cache) if name.endswith('.tmp')])
+        finally:
+            shutil.rmtree(cache)
+        return
+
+    def test_async_io(self):
+        import asyncio
+        from concurrent import futures
+        paths = [os.path.join(__resources__, name) for name in ['dict.json', 'dict.yml', 'list.yml']]
+        fname = '.datatypes-test-' + str(uuid.uuid1()) + '.yml'
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            data, other, items = loop.run_until_complete(asyncio.gather(*[composite.aload(path) for path in paths]))
+            self.assertEqual(data, self._dict)
+            self.assertEqual(other, self._dict)
+            self.assertEqual(items, self._list)
+            with futures.ThreadPoolExecutor(1) as executor:
+                self.assertTrue(loop.run_until_complete(composite.aload(paths[0], lazy=True, executor=executor))._lazy)
+
+            # writes a snapshot, unaffected by later changes
+            pending = data.awrite(fname)
+            data.four.five = 'changed'
+            loop.run_until_complete(pending)
+            self.assertEqual(loop.run_until_complete(composite.aload(fname)), self._dict)
+
+            # including changes through references held before the write,
+            # made while the write is queued behind another task
+            import threading
+            data = composite(self._dict)
+            four, three = data.four, data.three
+            release = threading.Event()
+            with futures.ThreadPoolExecutor(1) as executor:
+                executor.submit(release.wait)
+                pending = data.awrite(fname, executor=executor)
+                four.nine = 11
+                four.five.append(9)
+                three[2].three = 'five'
+                data.three[2].three = 'six'
+                release.set()
+                loop.run_until_complete(pending)
+            self.assertEqual(loop.run_until_complete(composite.aload(fname)), self._dict)
+            self.assertEqual(data.four.nine, 11)
+            self.assertEqual(three[2].three, 'six')
+
+            loaded = loop.run_until_complete(composite.aload_many(paths, workers=2))
+            self.assertEqual(list(loaded), paths)
+            self.assertEqual(loaded[paths[2]], self._list)
+            with self.assertRaises(AssertionError):
+                loop.run_until_complete(data.awrite(fname, format='xml'))
+        finally:
+            loop.close()
+            asyncio.set_event_loop(None)
+            if os.path.exists(fname):
+                os.remove(fname)
+        return
+
     def test_write(self):
         data = composite(self._dict)
         fname = '.datatypes-test-' + str(uuid.uuid1()) + '.json'
@@ -82,6 +326,147 @@ class TestComposite(unittest.TestCase):
         os.remove(fname)
         return
 
+    def test_write_streaming(self):
+        for lazy in [False, True]:
+            data = composite(self._dict, lazy=lazy)
+            data.four.nine = 11
+            expected = data.json()
+            stream = io.StringIO()
+            data.write_json(stream, pretty=True)
+            self.assertEqual(stream.getvalue(), json.dumps(expected, sort_keys=True, indent=4))
+            stream = io.StringIO()
+            data.write_json(stream, pretty=False)
+            self.assertEqual(stream.getvalue(), json.dumps(expected))
+
+        # non-string keys are sorted as they're encoded
+        data = composite({1: 'a', 'b': 2, 10: {2: None, 2 ** 70: True}, 2: [True]})
+        stream = io.StringIO()
+        data.write_json(stream, pretty=True, backend='json')
+        expected = json.loads(json.dumps(data.json()))
+        self.assertEqual(stream.getvalue(), json.dumps(expected, sort_keys=True, indent=4))
+
+        # output is written in chunks
+        data = composite([{'value': idx} for idx in range(5000)])
+        writes = []
+
+        class Handle(object):
+            def write(self, chunk):
+                writes.append(chunk)
+
+        data.write_json(Handle(), pretty=False)
+        self.assertTrue(len(writes) > 1)
+        self.assertEqual(json.loads(''.join(writes)), data.json())
+        return
+
+    def test_json_backends(self):
+        calls = []
+
+        def loads(string):
+            calls.append('loads')
+            return json.loads(string)
+
+        def dumps(obj, pretty=False):
+            calls.append('dumps')
+            return json.dumps(composite(obj).json())
+
+        composite.register_json_backend('test', loads, dumps)
+        data = composite(self._dict)
+        stream = io.StringIO()
+        data.write_json(stream, backend='test')
+        self.assertEqual(composite.from_json(stream.getvalue(), backend='test'), data)
+        self.assertEqual(calls, ['dumps', 'loads'])
+
+        try:
+            composite.use_json_backend('test')
+            composite.from_json(stream.getvalue())
+            self.assertEqual(calls[-1], 'loads')
+            composite.use_json_backend()
+            self.assertNotEqual(composite._json_backend, 'test')
+        finally:
+            composite.use_json_backend('json')
+
+        with self.assertRaises(AssertionError):
+            composite.use_json_backend('notabackend')
+
+        # all installed backends produce equivalent data
+        for backend in ['json', 'orjson', 'ujson', 'simdjson']:
+            try:
+                import_module(backend)
+            except ImportError:
+                continue
+            for pretty in [True, False]:
+                stream = io.StringIO()
+                data.write_json(stream, pretty=pretty, backend=backend)
+                self.assertEqual(json.loads(stream.getvalue()), self._dict)
+                self.assertEqual(composite.from_json(stream.getvalue(), backend=backend), data)
+        return
+
+    def test_from_string(self):
+        data = {'one': None, 'two': [True, False, 1.5, 2 ** 70], 'three': {u'f\xfcnf': "it's \"quoted\"\n"}}
+        for string in [str(data), json.dumps(data), yaml.dump(data)]:
+            self.assertEqual(composite.from_string(string), data)
+        self.assertEqual(composite.from_string(str(data), format='python'), data)
+        self.assertEqual(composite.from_string(str(self._list), lazy=True)._lazy, True)
+
+        # literals that can't be translated to json
+        self.assertEqual(composite.from_string("{'a': (1, 2), 1: u'b'}"), {'a': [1, 2], 1: 'b'})
+        self.assertEqual(composite.from_string("(1, [2])"), [1, [2]])
+        self.assertEqual(composite.from_string("{a: 1, b: [x]}"), {'a': 1, 'b': ['x']})
+
+        # strings are never evaluated
+        for string in ["__import__('os').getcwd()", "[len('abc')]"]:
+            with self.assertRaises((ValueError, SyntaxError)):
+                composite.from_string(string, format='python')
+        with self.assertRaises(TypeError):
+            composite.from_string("__import__('os').getcwd()")
+        with self.assertRaises(ValueError):
+            composite.from_string(str(data), format='json')
+        return
+
+    def test_binary_formats(self):
+        calls = []
+
+        def loads(string):
+            calls.append('loads')
+            return json.loads(string.decode('utf-8'))
+
+        def dumps(obj):
+            calls.append('dumps')
+            return json.dumps(composite(obj).json()).encode('utf-8')
+
+        composite.register_binary_format('test', loads, dumps)
+        data = composite(self._dict)
+        stream = io.BytesIO()
+        data.write_binary(stream, format='test')
+        self.assertEqual(composite.from_binary(stream.getvalue(), format='test'), data)
+        self.assertEqual(calls, ['dumps', 'loads'])
+        with self.assertRaises(AssertionError):
+            data.write_binary(io.BytesIO(), format='notaformat')
+
+        # installed formats round trip, and are detected by load
+        data = composite({'one': 1, 'two': [1.5, None, True], 3: {'four': u'f\xfcnf'}})
+        for name in ['msgpack', 'cbor']:
+            try:
+                import_module({'cbor': 'cbor2'}.get(name, name))
+            except ImportError:
+                continue
+            stream = io.BytesIO()
+            getattr(data, 'write_' + name)(stream)
+            self.assertEqual(getattr(composite, 'from_' + name)(stream.getvalue()), data)
+            stream.seek(0)
+            stream.name = 'data.' + name
+            self.assertEqual(composite.load(stream, lazy=True).json(), data.json())
+
+        # pickle as plain data
+        import pickle
+        for protocol in range(2, pickle.HIGHEST_PROTOCOL + 1):
+            for obj in [data, frozencomposite(data), composite(self._list, lazy=True)]:
+                copy = pickle.loads(pickle.dumps(obj, protocol))
+                self.assertEqual(copy, obj)
+                self.assertEqual(type(copy), type(obj))
+                self.assertEqual(copy._lazy, obj._lazy)
+        return
+
     def test_properties(self):
         data = composite(self._dict)
         self.assertEqual(len(data.items()), len(self._dict.items()))
@@ -138,6 +523,111 @@ class TestComposite(unittest.TestCase):
         self.assertEqual(data.two, 'three')
         return
 
+    def test_update_in_place(self):
+        data = composite(self._dict)
+        four, three = data.four, data.three
+        patch = {
+            'four': {'nine': 11, 'five': [8, 9], 'ten': None},
+            'three': [3, {'three': 4}],
+            'one': None,
+        }
+        data.update(patch)
+
+        # same semantics as addition
+        self.assertEqual(data, composite(self._dict) + patch)
+        self.assertTrue(data.four is four)
+        self.assertTrue(data.three is three)
+        self.assertEqual(data.four.five, [6, 7, 8, 9])
+        self.assertEqual(data.four.nine, 11)
+        self.assertEqual(data.three, ['one', 2, {'three': 'four'}, 3, {'three': 4}])
+        self.assertEqual(data.one, 1)
+
+        # patch isn't shared with object
+        patch['four']['five'].append(10)
+        data.four.five.append(11)
+        self.assertEqual(data.four.five, [6, 7, 8, 9, 11])
+        self.assertEqual(patch['four']['five'], [8, 9, 10])
+
+        # lists and indexed lists
+        data = composite({'records': [{'id': 1}]})
+        data.records.create_index('id')
+        data.update({'records': [{'id': 1}, {'id': 2}]})
+        self.assertEqual(data.records.lookup('id', 2), [{'id': 2}])
+        self.assertEqual(len(data.records), 2)
+
+        # small list patches are checked without hashing the list
+        records = [{'id': idx, 'tags': ['a'], 'size': {'w': idx}} for idx in range(40)]
+        for indexed in [False, True]:
+            data = composite({'records': records, 'values': [1, 'two', [3]]})
+            if indexed:
+                data.records.create_index('size.w')
+            data.update({'records': [{'id': 3, 'tags': ['a'], 'size': {'w': 3}}, {'id': 3, 'tags': ['b'], 'size': {'w': 3}}]})
+            data.update({'records': [{'tags': ['a'], 'size': {'w': 5}, 'id': 5}], 'values': ['two', [3], 4]})
+            self.assertEqual(len(data.records), 41)
+            self.assertEqual(data.records[-1].tags, ['b'])
+            self.assertEqual(data['values'], [1, 'two', [3], 4])
+            data.update({'records': records[:20] + [{'id': -1}]})
+            self.assertEqual(len(data.records), 42)
+        with self.assertRaises(AssertionError):
+            data.update([1, 2])
+        return
+
+    def test_diff(self):
+        data = composite(self._dict)
+        other = composite(self._dict).json()
+        other['four']['nine'] = 11
+        other['four']['five'].insert(0, 5)
+        other['two'].pop()
+        other['five'] = {'six': 6}
+        del other['one']
+        ops = data.diff(other)
+        self.assertEqual(sorted(ops, key=lambda op: op['path']), [
+            {'op': 'add', 'path': '/five', 'value': {'six': 6}},
+            {'op': 'add', 'path': '/four/five/0', 'value': 5},
+            {'op': 'replace', 'path': '/four/nine', 'value': 11},
+            {'op': 'remove', 'path': '/one'},
+            {'op': 'remove', 'path': '/two/2'},
+        ])
+        self.assertEqual(data.diff(self._dict), [])
+        self.assertEqual(composite({'a/b': 1}).diff({'a/b': 2}), [{'op': 'replace', 'path': '/a~1b', 'value': 2}])
+
+        # patch reproduces other, and ops aren't shared with data
+        data.patch(json.loads(json.dumps(ops)))
+        self.assertEqual(data, other)
+        ops[0].get('value', {})['seven'] = 8
+        self.assertEqual(data, other)
+        data.patch([{'op': 'add', 'path': '/two/-', 'value': 3}, {'op': 'replace', 'path': '', 'value': [1]}])
+        self.assertEqual(data, [1])
+
+        # patching derived composite objects doesn't change the original
+        base = composite(self._dict)
+        derived = base + {'one': 2}
+        derived.patch(base.diff(other))
+        self.assertEqual(derived, other)
+        self.assertEqual(base, self._dict)
+
+        # non-string keys are resolved from their pointers
+        data = composite({1: 'a', 2: {3: [1, 2]}, '4': 4})
+        other = {1: 'b', 2: {3: [1]}, '4': 5}
+        data.patch(data.diff(other))
+        self.assertEqual(data, other)
+
+        with self.assertRaises(KeyError):
+            composite(self._dict).patch([{'op': 'replace', 'path': '/missing', 'value': 1}])
+        with self.assertRaises(IndexError):
+            composite(self._dict).patch([{'op': 'add', 'path': '/two/4', 'value': 4}])
+        with self.assertRaises(IndexError):
+            composite(self._dict).patch([{'op': 'replace', 'path': '/two/3', 'value': 4}])
+        with self.assertRaises(IndexError):
+            composite(self._dict).patch([{'op': 'remove', 'path': '/two/-1'}])
+        with self.assertRaises(IndexError):
+            composite(self._dict).patch([{'op': 'add', 'path': '/three/5/three', 'value': 4}])
+        with self.assertRaises(AssertionError):
+            composite(self._dict).patch([{'op': 'move', 'path': '/one', 'from': '/two'}])
+        with self.assertRaises(TypeError):
+            frozencomposite(self._dict).patch(ops)
+        return
+
     def test_iteration(self):
         data = composite(self._dict)
         self.assertEqual(sorted([i for i in data]), sorted(['one', 'two', 'three', 'four']))
@@ -196,6 +686,421 @@ class TestComposite(unittest.TestCase):
         self.assertEqual(data, composite(self._dict))
         self.assertNotEqual(data, self._list)
         self.assertNotEqual(data, composite(self._list))
+        self.assertNotEqual(data, 1)
+        self.assertEqual(data, composite(self._dict, lazy=True))
+        self.assertEqual(composite(self._dict, lazy=True), data)
+
+        # nested mismatches in value, type, length and keys
+        other = composite(self._dict)
+        other.four.five[2] = 9
+        self.assertNotEqual(data, other)
+        other.four.five = {'six': 7}
+        self.assertNotEqual(data, other)
+        other.four.five = [6, 7, 8, 9]
+        self.assertNotEqual(data, other)
+        other.four.five = [6, 7, 8]
+        self.assertEqual(data, other)
+        other.four.ten = 10
+        self.assertNotEqual(data, other)
+        del other.four['nine']
+        self.assertNotEqual(data, other)
+        return
+
+    def test_frozen(self):
+        for lazy in [False, True]:
+            data = frozencomposite(self._dict, lazy=lazy)
+            self.assertEqual(data, self._dict)
+            self.assertEqual(data, composite(self._dict))
+            self.assertTrue(isinstance(data.four, frozencomposite))
+            self.assertTrue(isinstance(data.three[2], frozencomposite))
+            self.assertEqual(hash(data), hash(frozencomposite(self._dict)))
+            self.assertEqual(hash(data), hash(frozencomposite(composite(self._dict))))
+            self.assertNotEqual(hash(data), hash(frozencomposite(self._list)))
+
+        # mutation
+        data = frozencomposite(self._dict)
+        with self.assertRaises(TypeError):
+            data.one = 2
+        with self.assertRaises(TypeError):
+            data['one'] = 2
+        with self.assertRaises(TypeError):
+            del data['one']
+        with self.assertRaises(TypeError):
+            data.update({'one': 2})
+        with self.assertRaises(TypeError):
+            data.two.append(4)
+        self.assertEqual(data, self._dict)
+
+        # frozen copies of mutable data
+        mutable = composite(self._dict)
+        data = frozencomposite(mutable)
+        mutable.four.nine = 11
+        self.assertEqual(data.four.nine, 10)
+        thawed = composite(data)
+        thawed.one = 2
+        self.assertEqual(data.one, 1)
+
+        # nested data are thawed too (as they're accessed)
+        for lazy in [False, True]:
+            frozen = frozencomposite(self._dict, lazy=lazy)
+            thawed = composite(frozen)
+            thawed.four['nine'] = 11
+            thawed.four.five.append(9)
+            thawed.three[2].three = 'five'
+            self.assertTrue(type(thawed.four) is composite)
+            self.assertEqual(thawed.four.nine, 11)
+            self.assertEqual(thawed.three[2], {'three': 'five'})
+            self.assertEqual(frozen, self._dict)
+            self.assertTrue(all(type(item) is not frozencomposite for item in composite(frozen).values()))
+
+        # hashable
+        records = [frozencomposite({'id': idx, 'tags': ['a', 'b']}) for idx in range(10)]
+        lookup = {record: record.id for record in records}
+        self.assertEqual(lookup[frozencomposite({'tags': ['a', 'b'], 'id': 3})], 3)
+        self.assertEqual(len(set(records + records)), 10)
+        self.assertTrue(data._hash is None)
+        hash(data)
+        self.assertTrue(data.four._hash is not None)
+        return
+
+    def test_paths(self):
+        for lazy in [False, True]:
+            data = composite(self._dict, lazy=lazy)
+            self.assertEqual(data.get_path('four.five[1]'), 7)
+            self.assertEqual(data.get_path('four.five.1'), 7)
+            self.assertEqual(data.get_path('three[-1].three'), 'four')
+            self.assertEqual(data.get_path(['four', 'nine']), 10)
+            self.assertEqual(data.get_path("['four']['eleven']"), 'twelve')
+            self.assertEqual(data.get_path('four', None), data.four)
+            self.assertEqual(data.get_path('four.six', None), None)
+            with self.assertRaises(KeyError):
+                data.get_path('four.six')
+            with self.assertRaises(KeyError):
+                data.get_path('four.five[3]')
+
+            data.set_path('four.five[1]', 2)
+            data.set_path('four.six', 7)
+            self.assertEqual(data.four.five, [6, 2, 8])
+            self.assertEqual(data.four.six, 7)
+            with self.assertRaises(KeyError):
+                data.set_path('seven.eight', 9)
+
+        # compiled accessors
+        getter = composite.compile_path('tags[1].name')
+        self.assertTrue(composite.compile_path('tags[1].name') is getter)
+        records = composite([{'tags': [{'name': 'a'}, {'name': str(idx)}]} for idx in range(3)] + [{}])
+        self.assertEqual(getter(records[1]), '1')
+        self.assertEqual(getter.map(records, None), ['0', '1', '2', None])
+        getter.set(records[0], 'b')
+        self.assertEqual(records[0].tags[1].name, 'b')
+        self.assertEqual(getter({'tags': [None, {'name': 'c'}]}), 'c')
+        with self.assertRaises(ValueError):
+            composite.compile_path('four..five')
+        with self.assertRaises(TypeError):
+            frozencomposite(self._dict).set_path('four.nine', 11)
+        return
+
+    def test_select(self):
+        records = {'name': 'catalog', 'items': [
+            {'id': idx, 'tags': [{'name': 'tag{}'.format(idx % 2)}], 'size': {'width': idx}}
+            for idx in range(4)
+        ]}
+        for lazy in [False, True]:
+            data = composite(records, lazy=lazy)
+            self.assertEqual(list(data.select('items[*].id')), [0, 1, 2, 3])
+            self.assertEqual(list(data.select('items.*.id')), [0, 1, 2, 3])
+            self.assertEqual(list(data.select('items[?id >= 2].id')), [2, 3])
+            self.assertEqual(list(data.select('items[?size.width < 2].id')), [0, 1])
+            self.assertEqual(list(data.select('items[?id != 0].tags[0].name')), ['tag1', 'tag0', 'tag1'])
+            self.assertEqual(list(data.select("items[?tags[0].name == 'tag1'].id")), [1, 3])
+            self.assertEqual(list(data.select('items[*].tags[?name=="tag0"]')), [{'name': 'tag0'}] * 2)
+            self.assertEqual(list(data.select('..name')), ['catalog', 'tag0', 'tag1', 'tag0', 'tag1'])
+            self.assertEqual(list(data.select('items..[?width].width')), [0, 1, 2, 3])
+            self.assertEqual(list(data.select('items[?missing]')), [])
+            self.assertEqual(list(data.select('missing[*]')), [])
+            self.assertEqual(list(data.select('items[?id > "a"]')), [])
+
+        # lazy evaluation
+        data = composite(records)
+        matches = data.select('items[?id > 0]')
+        self.assertEqual(next(matches).id, 1)
+        self.assertEqual(next(matches).id, 2)
+        with self.assertRaises(ValueError):
+            list(data.select('items[?id == value]'))
+        return
+
+    def test_index(self):
+        for lazy in [False, True]:
+            data = composite([{'id': idx % 5, 'n': idx, 'size': {'width': idx % 2}} for idx in range(20)], lazy=lazy)
+            data.create_index('id')
+            data.create_index('size.width')
+            self.assertEqual([item['n'] for item in data.lookup('id', 3)], [3, 8, 13, 18])
+            self.assertEqual(len(data.lookup('size.width', 1)), 10)
+            self.assertEqual(data.lookup('id', 5), [])
+
+            # index is maintained through changes to list
+            data.append({'id': 3, 'n': 20})
+            data.extend([{'id': 3, 'n': 21}, {'n': 22}])
+            del data[3]
+            data[8] = {'id': 5, 'n': 23}
+            self.assertEqual([item['n'] for item in data.lookup('id', 3)], [8, 13, 18, 20, 21])
+            self.assertEqual([item['n'] for item in data.lookup('id', 5)], [23])
+            data[0:2] = [{'id': 5, 'n': 24}]
+            self.assertEqual([item['n'] for item in data.lookup('id', 5)], [24, 23])
+            self.assertEqual([item['n'] for item in data.lookup('id', 1)], [6, 11, 16])
+
+            # items changed in place are re-indexed explicitly
+            data[2].id = 6
+            self.assertEqual(data.lookup('id', 6), [])
+            data.create_index('id')
+            self.assertEqual(data.lookup('id', 6), [data[2]])
+
+        with self.assertRaises(AssertionError):
+            composite([{'id': 1}]).lookup('id', 1)
+        with self.assertRaises(AssertionError):
+            composite(self._dict).create_index('one')
+        with self.assertRaises(AssertionError):
+            composite(self._dict).lookup('one', 1)
+        return
+
+    def test_copy_on_write(self):
+        base = composite(self._dict)
+        base.three[2]  # noqa
+        for derive, shared in [
+            (lambda: base + {'one': 2}, True),
+            (lambda: base.union(composite({'one': 2}), overwrite=True), True),
+            (lambda: base.intersection(composite(self._dict)), False),
+            (lambda: base.difference(composite({'one': 2})), True),
+        ]:
+            # subtrees are shared until they're changed
+            derived = derive()
+            self.assertEqual(derived._data['four']._data is base._data['four']._data, shared)
+            derived.four.nine = 11
+            derived.four.five.append(9)
+            derived.three[2].three = 'five'
+            self.assertEqual(base, self._dict)
+            self.assertEqual(derived.four.nine, 11)
+            self.assertEqual(derived.four.five, [6, 7, 8, 9])
+            self.assertEqual(derived.three[2].three, 'five')
+
+        # changes to the original aren't visible in derived objects
+        base = composite(self._dict)
+        derived = base + {'one': 2}
+        base.four.five.append(9)
+        base.four.nine = 11
+        self.assertEqual(derived.four, self._dict['four'])
+        self.assertEqual(derived.one, 2)
+
+        # lists
+        base = composite(self._list)
+        derived = base + [4]
+        derived[1].six.append(11)
+        self.assertEqual(base, self._list)
+        self.assertEqual(derived[1].six, [7, 8, 9, 'ten', 11])
+        self.assertEqual(derived[-1], 4)
+
+        # updates
+        other = composite({'four': {'twelve': 13}, 'six': {'seven': 8}})
+        data = composite(self._dict)
+        data.update(other)
+        data.six.seven = 9
+        data.four.twelve = 14
+        self.assertEqual(other.json(), {'four': {'twelve': 13}, 'six': {'seven': 8}})
+        self.assertEqual(data.four.nine, 10)
+
+        # indexes follow copies of shared records
+        records = composite([{'id': idx} for idx in range(3)])
+        records.create_index('id')
+        derived = records + []
+        derived = records + [{'id': 3}]
+        self.assertEqual(derived[0], {'id': 0})
+        self.assertTrue(records.lookup('id', 0)[0] is records[0])
+        self.assertTrue(records.lookup('id', 0)[0] is not derived[0])
+        derived.create_index('id')
+        derived.lookup('id', 1)[0].id = 'one'
+        self.assertEqual(records[1].id, 1)
+        self.assertEqual(derived.lookup('id', 'one'), [])
+
+        # references taken before deriving stay attached, and isolated
+        for derive in [lambda data: data + {'x': 1}, lambda data: data.union(composite({'x': 1}))]:
+            base = composite({'db': {'host': 'a'}, 'items': [{'id': 1}]})
+            db, items = base.db, base['items']
+            derived = derive(base)
+            db.host = 'b'
+            items.append({'id': 2})
+            self.assertEqual(base.db.host, 'b')
+            self.assertTrue(base.db is db)
+            self.assertEqual(base['items'], [{'id': 1}, {'id': 2}])
+            self.assertEqual(derived.db.host, 'a')
+            self.assertEqual(derived['items'], [{'id': 1}])
+            derived.db.host = 'c'
+            derived['items'][0].id = 3
+            self.assertEqual(db.host, 'b')
+            self.assertEqual(items[0].id, 1)
+
+        # nested references taken after deriving, on either side
+        base = composite(self._dict)
+        derived = base + {'one': 2}
+        left, right = base.three[2], derived.three[2]
+        left.three = 'left'
+        right.three = 'right'
+        self.assertEqual(base.three[2].three, 'left')
+        self.assertEqual(derived.three[2].three, 'right')
+        self.assertTrue(base.three[2] is left)
+        return
+
+    def test_map_filter(self):
+        import operator
+        from concurrent.futures import ThreadPoolExecutor
+        data = composite([{'id': idx, 'price': idx * 1.5, 'tags': [idx]} for idx in range(50)])
+        prices = [idx * 1.5 for idx in range(50)]
+        self.assertEqual(data.map(lambda item: item.price), prices)
+        self.assertEqual(data.map(lambda item: item.price, executor='thread', batch_size=7), prices)
+        self.assertEqual(data.map(operator.itemgetter('price'), executor='process', workers=2), prices)
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(data.map(lambda item: item.price, executor=executor), prices)
+            self.assertEqual(len(data.filter(lambda item: item.id % 2, executor=executor, batch_size=3)), 25)
+        self.assertEqual([item.id for item in data.filter(lambda item: item.id > 46)], [47, 48, 49])
+
+        # unchanged items are shared (and copied on write)
+        result = data.map(lambda item: item if item.id % 2 else {'id': item.id})
+        self.assertTrue(result._data[1]._data is data._data[1]._data)
+        self.assertEqual(result[2], {'id': 2})
+        result[1].tags.append(2)
+        data.filter(bool)[3].tags.append(4)
+        self.assertEqual(data[1].tags, [1])
+        self.assertEqual(data[3].tags, [3])
+        self.assertEqual(result[1].tags, [1, 2])
+
+        with self.assertRaises(AssertionError):
+            composite(self._dict).map(len)
+        with self.assertRaises(AssertionError):
+            data.map(len, executor='notanexecutor')
+        return
+
+    def test_columns(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest('numpy is not installed')
+        data = composite([
+            {'id': 1, 'price': 2.5, 'active': True, 'name': 'one', 'size': {'width': 1}},
+            {'id': 2, 'price': 4, 'active': False, 'name': 'two', 'size': {'width': 2}},
+            {'id': 3, 'active': True, 'size': {'width': 3}, 'extra': 2 ** 70},
+        ])
+        columns = data.to_columns()
+        self.assertEqual(sorted(columns), ['active', 'extra', 'id', 'name', 'price', 'size'])
+        self.assertEqual(columns['id'].dtype, numpy.int64)
+        self.assertEqual(columns['active'].dtype, bool)
+        self.assertEqual(columns['price'].dtype, numpy.float64)
+        self.assertEqual(columns['name'].dtype, object)
+        self.assertEqual(columns['id'].sum(), 6)
+        self.assertEqual(columns['price'].sum(), 6.5)
+        self.assertEqual(columns['price'].mask.tolist(), [False, False, True])
+        self.assertEqual(columns['name'].tolist(), ['one', 'two', None])
+        self.assertEqual(columns['extra'].tolist(), [None, None, 2 ** 70])
+        self.assertEqual(columns['size'][0].width, 1)
+
+        # missing values keep column types, and aren't None
+        columns = composite([{'id': 1, 'count': 2}, {'id': 2, 'count': None}, {'id': 3}]).to_columns()
+        self.assertEqual(columns['count'].dtype, object)
+        self.assertEqual(columns['count'].mask.tolist(), [False, False, True])
+        columns = composite([{'id': 1, 'count': 2}, {'id': 2}]).to_columns()
+        self.assertEqual(columns['count'].dtype, numpy.int64)
+
+        # paths, and lazy objects
+        columns = composite(data.json(), lazy=True).to_columns(fields=['id', 'size.width', 'missing'])
+        self.assertEqual(columns['size.width'].tolist(), [1, 2, 3])
+        self.assertEqual(columns['missing'].mask.tolist(), [True, True, True])
+
+        # round trip
+        records = data + [{'id': 4, 'count': 5, 'none': None}]
+        columns = records.to_columns()
+        self.assertEqual(composite.from_columns(columns), records)
+        self.assertEqual(type(composite.from_columns(columns)[3]['count']), int)
+        columns = records.to_columns(fields=['id', 'size.width', 'none'])
+        self.assertEqual(composite.from_columns(columns)[3], {'id': 4, 'none': None})
+
+        # reverse
+        columns = data.to_columns(fields=['id', 'name', 'size'])
+        records = composite.from_columns(columns)
+        self.assertEqual(records, [{'id': 1, 'name': 'one', 'size': {'width': 1}},
+                                   {'id': 2, 'name': 'two', 'size': {'width': 2}},
+                                   {'id': 3, 'size': {'width': 3}}])
+        self.assertEqual(type(records[0].id), int)
+        records[0].size.width = 5
+        self.assertEqual(data[0].size.width, 1)
+        with self.assertRaises(AssertionError):
+            composite.from_columns({'id': [1, 2], 'name': ['one']})
+        with self.assertRaises(AssertionError):
+            composite(self._dict).to_columns()
+        with self.assertRaises(AssertionError):
+            composite(self._list).to_columns()
+        return
+
+    def test_snapshot(self):
+        fname = '.datatypes-test-' + str(uuid.uuid1()) + '.snap'
+        data = composite(self._dict)
+        data.four.big = 2 ** 70
+        data.four.ratio = -0.5
+        data.four.text = u'caf\xe9'
+        data.save_snapshot(fname)
+        try:
+            snap = composite.open_snapshot(fname)
+
+            # nodes are decoded on first access
+            self.assertTrue(snap._store is None)
+            self.assertEqual(snap.four.five[1], 7)
+            self.assertTrue(snap.three._store is None)
+            self.assertEqual(snap, data)
+            self.assertEqual(snap.json(), data.json())
+            self.assertEqual(snap.four.big, 2 ** 70)
+            self.assertEqual(snap.four.text, u'caf\xe9')
+
+            # read-only, but usable like other frozen composite objects
+            self.assertTrue(isinstance(snap, frozencomposite))
+            self.assertEqual(hash(snap), hash(frozencomposite(data)))
+            with self.assertRaises(TypeError):
+                snap.one = 2
+            with self.assertRaises(TypeError):
+                snap.four.five.append(9)
+            copy = composite(snap)
+            copy.one = 2
+            self.assertEqual((snap + {'one': 2}).one, 2)
+            self.assertEqual(snap.one, 1)
+            self.assertEqual(snap.diff(copy), [{'op': 'replace', 'path': '/one', 'value': 2}])
+
+            import pickle
+            self.assertEqual(pickle.loads(pickle.dumps(snap)), data)
+        finally:
+            os.remove(fname)
+
+        with open(fname, 'w') as fi:
+            fi.write('{}')
+        try:
+            with self.assertRaises(AssertionError):
+                composite.open_snapshot(fname)
+        finally:
+            os.remove(fname)
+        return
+
+    def test_compact(self):
+        import copy
+        import pickle
+        data = composite(self._dict)
+        self.assertFalse(hasattr(data, '__dict__'))
+        self.assertFalse(hasattr(frozencomposite(self._dict), '__dict__'))
+        self.assertEqual(data.meta_type, 'dict')
+        self.assertEqual(data.two.meta_type, 'list')
+        self.assertEqual(data._list, [])
+        self.assertEqual(data.two._dict, {})
+        with self.assertRaises(AssertionError):
+            data.two.five = 5
+
+        # copies restore internal state
+        for obj in [data, frozencomposite(self._dict)]:
+            self.assertEqual(copy.deepcopy(obj), self._dict)
+            self.assertEqual(pickle.loads(pickle.dumps(obj)), self._dict)
         return
 
     def test_exceptions(self):
@@ -204,6 +1109,11 @@ class TestComposite(unittest.TestCase):
             data['notakey']
         with self.assertRaises(AttributeError):
             data.notakey
+        with self.assertRaises(AttributeError):
+            data.two.notakey
+
+        # uninitialized objects (i.e. while unpickling) don't recurse
+        self.assertFalse(hasattr(composite.__new__(composite), 'one'))
         return
 
     def test_intersection(self):
@@ -242,6 +1152,27 @@ class TestComposite(unittest.TestCase):
         self.assertEqual(self._c1.union(self._c2), result)
         return
 
+    def test_list_set_operations(self):
+        left = composite([1, 2, 2, {'id': 1, 'tags': ['a']}, {'id': 2}, [3, 4], 'five'])
+        right = composite([2, {'tags': ['a'], 'id': 1}, [3, 4], 'six', 'six', {'id': 3}])
+        self.assertEqual(left.intersection(right), [2, 2, {'id': 1, 'tags': ['a']}, [3, 4]])
+        self.assertEqual(left.difference(right), [1, {'id': 2}, 'five'])
+        self.assertEqual(left.union(right), left.json() + ['six', 'six', {'id': 3}])
+        self.assertEqual(right.union(left), right.json() + [1, {'id': 2}, 'five'])
+
+        # unhashable and mixed numeric values
+        left = composite([1.0, True, set([1])])
+        right = composite([1, set([1])])
+        self.assertEqual(len(left.intersection(right)), 3)
+        self.assertEqual(len(left.difference(right)), 0)
+
+        # frozen items
+        left = composite([frozencomposite({'id': idx}) for idx in range(100)])
+        right = composite([{'id': idx} for idx in range(50, 150)])
+        self.assertEqual(len(left.intersection(right)), 50)
+        self.assertEqual(left.difference(right), [{'id': idx} for idx in range(50)])
+        return
+
     def test_filetypes(self):
         with open(os.path.join(__resources__, 'list.json'), 'r') as fi:
             js = composite.from_json(fi)
@@ -264,6 +1195,58 @@ class TestComposite(unittest.TestCase):
         self.assertEqual(js, yml)
         return
 
+    def test_yaml(self):
+        for lazy in [False, True]:
+            data = composite(self._dict, lazy=lazy)
+            stream = io.StringIO()
+            data.write_yaml(stream)
+            self.assertEqual(stream.getvalue(), yaml.dump(self._dict))
+            self.assertEqual(composite.from_yaml(stream.getvalue()), data)
+            self.assertEqual(composite.from_yaml(stream.getvalue(), safe=True), data)
+
+            # shared children aren't written as aliases
+            sub = composite({'one': [1, 2]}, lazy=lazy)
+            data = composite({'a': sub, 'b': sub, 'c': sub.one, 'd': sub.one})
+            stream = io.StringIO()
+            data.write_yaml(stream)
+            self.assertEqual(stream.getvalue(), yaml.dump(data.json()))
+            self.assertFalse('&' in stream.getvalue())
+
+        tagged = u'one: !!python/tuple [1, 2]'
+        self.assertEqual(composite.from_yaml(tagged).one, [1, 2])
+        with self.assertRaises(yaml.YAMLError):
+            composite.from_yaml(tagged, safe=True)
+        with self.assertRaises(yaml.YAMLError):
+            composite.load(io.StringIO(tagged), safe=True)
+        return
+
+    def test_format_detection(self):
+        with open(os.path.join(__resources__, 'dict.yml'), 'r') as fi:
+            content = fi.read()
+        self.assertEqual(composite.load(io.StringIO(content)), self._dict)
+        self.assertEqual(composite.load(io.StringIO('---\n' + content)), self._dict)
+        self.assertEqual(composite.load(io.StringIO(u'\n  {"one": 1}')), {'one': 1})
+        self.assertEqual(composite.load(io.StringIO(u'{one: 1}'), format='yaml'), {'one': 1})
+        self.assertEqual(composite.load(io.BytesIO(b'{"one": 1}')), {'one': 1})
+        self.assertEqual(composite.load(io.StringIO(u'[[1, "two"], {}, null]')), [[1, 'two'], {}, None])
+
+        # yaml flow collections and quoted keys aren't mistaken for json
+        self.assertEqual(composite.load(io.StringIO(u'{one: 1, two: [x]}')), {'one': 1, 'two': ['x']})
+        self.assertEqual(composite.load(io.StringIO(u'[x, {y: 1}]')), ['x', {'y': 1}])
+        self.assertEqual(composite.load(io.StringIO(u'"one": 1\ntwo: [2]\n')), {'one': 1, 'two': [2]})
+        self.assertEqual(composite.load(io.BytesIO(b'"one": 1')), {'one': 1})
+        with self.assertRaises(ValueError):
+            composite.load(io.StringIO(u'{"one": }'))
+        with self.assertRaises(AssertionError):
+            composite.load(io.StringIO(u'{}'), format='xml')
+
+        with open(os.path.join(__resources__, 'dict.yml'), 'r') as fi:
+            entries = dict(composite.iterload(fi, path='four'))
+        self.assertEqual(entries, self._dict['four'])
+        stream = io.StringIO(content)
+        self.assertEqual(dict(composite.iterload(stream, path='four')), self._dict['four'])
+        return
+
 
 class TestFiletree(unittest.TestCase):
     _dir = os.path.realpath(